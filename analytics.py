@@ -0,0 +1,136 @@
+import json
+import os
+import queue
+import threading
+import time
+
+_TICK = object()
+
+
+class AnalyticsWriter:
+    """
+    buffered JSON-Lines writer for interaction logs
+    write() only puts the record on a queue, a background thread appends
+    batches to the file once max_buffer records are waiting or every
+    flush_interval seconds, and rotates the file past max_bytes
+    (analytics_log.jsonl -> analytics_log.jsonl.1 -> ... .backups)
+    """
+    def __init__(self, path="analytics_log.jsonl", max_buffer=100, flush_interval=2.0,
+                 max_bytes=10 * 1024 * 1024, backups=5):
+        self.path = path
+        self.max_buffer = max_buffer
+        self.flush_interval = flush_interval
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._queue = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def write(self, record):
+        if not self._closed:
+            self._queue.put(record)
+
+    def flush(self, timeout=None):
+        """
+        block until every record written so far is on disk
+        """
+        done = threading.Event()
+        self._queue.put(done)
+        done.wait(timeout)
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        buffer = []
+        waiters = []
+        deadline = time.monotonic() + self.flush_interval
+        while True:
+            try:
+                item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                item = _TICK
+            stop = item is None
+            if isinstance(item, threading.Event):
+                waiters.append(item)
+            elif item is not None and item is not _TICK:
+                buffer.append(item)
+            if stop or waiters or len(buffer) >= self.max_buffer or time.monotonic() >= deadline:
+                if buffer:
+                    self._append(buffer)
+                    buffer = []
+                for waiter in waiters:
+                    waiter.set()
+                waiters = []
+                deadline = time.monotonic() + self.flush_interval
+            if stop:
+                return
+
+    def _append(self, records):
+        data = "".join(json.dumps(record) + "\n" for record in records)
+        if os.path.exists(self.path) and os.path.getsize(self.path) + len(data) > self.max_bytes:
+            self._rotate()
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(data)
+
+    def _rotate(self):
+        for i in range(self.backups - 1, 0, -1):
+            if os.path.exists(f"{self.path}.{i}"):
+                os.replace(f"{self.path}.{i}", f"{self.path}.{i + 1}")
+        if self.backups:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+
+def iter_records(path, chunk_size=64 * 1024):
+    """
+    stream records from a JSON array file (the old analytics_log.json)
+    or a JSON-Lines file without loading the whole file
+    """
+    decoder = json.JSONDecoder()
+    with open(path, "r", encoding="utf-8") as f:
+        buf = f.read(chunk_size)
+        pos = 0
+        eof = not buf
+        in_array = buf.lstrip().startswith("[")
+        if in_array:
+            pos = buf.index("[") + 1
+        while True:
+            # skip whitespace and, inside an array, the commas between records
+            while pos < len(buf) and (buf[pos].isspace() or (in_array and buf[pos] == ",")):
+                pos += 1
+            if pos >= len(buf):
+                if eof:
+                    return
+                buf = f.read(chunk_size)
+                pos = 0
+                eof = not buf
+                continue
+            if in_array and buf[pos] == "]":
+                return
+            try:
+                record, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                more = f.read(chunk_size)
+                eof = not more
+                buf = buf[pos:] + more
+                pos = 0
+                continue
+            # a number or literal cut at the chunk boundary may still be growing
+            if end == len(buf) and not eof:
+                more = f.read(chunk_size)
+                if more:
+                    buf = buf[pos:] + more
+                    pos = 0
+                    continue
+                eof = True
+            yield record
+            pos = end
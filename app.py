@@ -1,15 +1,16 @@
 import tkinter as tk
-from tkinter import filedialog, scrolledtext, messagebox, ttk
-import subprocess
+from tkinter import filedialog, scrolledtext, messagebox, simpledialog, ttk
 import threading
+import queue
 import fitz  # PyMuPDF
 import markdown
 from PIL import Image, ImageTk
 import webbrowser
 import sys
 import platform
-import speech_recognition as sr
-import pyttsx3
+from chat_server import connect
+from audio_workers import TTSWorker, RecognizerWorker, SentenceBuffer
+from transcript import Transcript
 
 class ChatApplication:
     def __init__(self, root):
@@ -23,7 +24,15 @@ class ChatApplication:
         self.font_size = 11
         self.current_file = None
 
-        self.tts_engine = pyttsx3.init()
+        # background threads never touch Tk, they post to ui_queue instead
+        self.ui_queue = queue.Queue()
+        self.tts_worker = TTSWorker()
+        self.recognizer = RecognizerWorker(self.ui_queue)
+        self.transcript = Transcript()
+        # sentences of the answer that is streaming in, None when it should not be spoken
+        self.speech = None
+        # transcript id of the answer that is streaming in
+        self.stream_id = None
 
         self.setup_styles()
         self.create_widgets()
@@ -31,6 +40,37 @@ class ChatApplication:
         self.create_status_bar()
         self.start_chatbot_process()
         self.setup_keybindings()
+        self.poll_ui_queue()
+
+    def post(self, kind, *args):
+        self.ui_queue.put((kind, *args))
+
+    def poll_ui_queue(self):
+        try:
+            while True:
+                kind, *args = self.ui_queue.get_nowait()
+                if kind == "message":
+                    self.insert_message(*args)
+                elif kind == "stream_start":
+                    self.stream_id = self.transcript.append(args[0], "")
+                    self.speech = SentenceBuffer()
+                elif kind == "chunk":
+                    self.insert_chunk(args[0])
+                elif kind == "stream_end":
+                    rest = self.speech.flush() if self.speech is not None else ""
+                    if rest:
+                        self.tts_worker.say(rest)
+                    self.speech = None
+                elif kind == "status":
+                    self.status_var.set(args[0])
+                elif kind == "voice":
+                    self.input_var.set(args[0])
+                    self.send_message()
+        except queue.Empty:
+            pass
+        self.render_transcript()
+        # about one frame at 60 fps
+        self.root.after(16, self.poll_ui_queue)
 
     def setup_styles(self):
         self.style = ttk.Style()
@@ -59,6 +99,7 @@ class ChatApplication:
 
         self.text_area = scrolledtext.ScrolledText(self.chat_frame, wrap=tk.WORD, font=("Segoe UI", self.font_size), padx=10, pady=10, bg="white", fg="#333333", insertbackground="#333333", relief="flat")
         self.text_area.pack(fill=tk.BOTH, expand=True)
+        self.text_area.config(yscrollcommand=self.on_transcript_scroll)
         self.text_area.config(state=tk.DISABLED)
 
         self.input_frame = ttk.Frame(self.main_frame)
@@ -102,6 +143,7 @@ class ChatApplication:
 
         self.edit_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.edit_menu.add_command(label="Clear Chat", command=self.clear_chat, accelerator="Ctrl+Del")
+        self.edit_menu.add_command(label="Search History", command=self.search_history, accelerator="Ctrl+F")
 
         self.view_menu = tk.Menu(self.menu_bar, tearoff=0)
         self.view_menu.add_command(label="Toggle Dark Mode", command=self.toggle_theme, accelerator="Ctrl+T")
@@ -132,6 +174,7 @@ class ChatApplication:
         self.root.bind("<Control-plus>", lambda e: self.adjust_font_size(1))
         self.root.bind("<Control-minus>", lambda e: self.adjust_font_size(-1))
         self.root.bind("<Control-Delete>", lambda e: self.clear_chat())
+        self.root.bind("<Control-f>", lambda e: self.search_history())
 
     def create_icon(self, fill_color, bg_color):
         img = Image.new('RGB', (16, 16), bg_color)
@@ -150,29 +193,107 @@ class ChatApplication:
         file_path = filedialog.askopenfilename(filetypes=[("PDF files", ".pdf"), ("Markdown", ".md"), ("Text files", ".txt"), ("All files", ".*")])
         if not file_path:
             return
-        self.status_var.set(f"Uploaded {file_path}")
-        self.insert_message("System", f"Document {file_path.split('/')[-1]} uploaded and ready.")
+        if self.chat_client is None:
+            self.status_var.set("Enter your name and email before uploading documents.")
+            return
+        # extracted and indexed by the chat server in the background
+        self.status_var.set(f"Processing {file_path}...")
+        self.outgoing.put(("document", file_path))
     
     def send_message(self, event=None):
         message = self.input_var.get().strip()
         if message:
             self.insert_message("You", message)
             self.input_var.set("")
-            if self.chatbot_process and self.chatbot_process.stdin:
-                self.chatbot_process.stdin.write(message + "\n")
-                self.chatbot_process.stdin.flush()
+            # the answer to the previous question is stale now
+            self.tts_worker.cancel()
+            self.speech = None
+            self.outgoing.put(message)
+
+    def format_message(self, sender, message):
+        return f"{sender}: {message}\n"
 
     def insert_message(self, sender, message):
+        # rendered with everything else that arrives in the same frame
+        self.transcript.append(sender, message)
+
+        if sender == "NSFAS Chatbot":
+            self.tts_worker.say(message)
+
+    def insert_chunk(self, text):
+        # a streamed answer grows in place, each finished sentence is spoken right away
+        # (the student may have sent another message below it meanwhile)
+        self.transcript.extend(self.stream_id, text)
+        if self.speech is not None:
+            for sentence in self.speech.feed(text):
+                self.tts_worker.say(sentence)
+
+    def render_transcript(self):
+        if not self.transcript.pending and not self.transcript.pending_chunks:
+            return
+        restored = self.transcript.restored_pages
+        chunks = self.transcript.take_chunks()
+        first = self.transcript.first_pending
+        batch, dropped = self.transcript.take_pending()
         self.text_area.config(state=tk.NORMAL)
-        self.text_area.insert(tk.END, f"{sender}: {message}\n")
+        if restored:
+            # older pages are on screen, go back to the live window
+            self.transcript.reset_restored()
+            self.text_area.delete(1.0, tk.END)
+            self.insert_messages(self.transcript.rendered, self.transcript.first_rendered)
+        else:
+            for message_id, text in chunks:
+                if message_id == self.stream_id:
+                    self.text_area.insert("stream", text)
+            self.insert_messages(batch, first)
+            if dropped:
+                lines = sum(self.format_message(*m).count("\n") for m in dropped)
+                self.text_area.delete(1.0, f"{lines + 1}.0")
         self.text_area.config(state=tk.DISABLED)
         self.text_area.see(tk.END)
 
-        if sender == "NSFAS Chatbot":
-            self.tts_engine.say(message)
-            self.tts_engine.runAndWait()
+    def insert_messages(self, messages, first_id):
+        # messages[i] has transcript id first_id + i
+        formatted = [self.format_message(*m) for m in messages]
+        self.text_area.insert(tk.END, "".join(formatted))
+        i = -1 if self.stream_id is None else self.stream_id - first_id
+        if 0 <= i < len(formatted):
+            # the "stream" mark sits before the newline that ends the streaming answer,
+            # its chunks are inserted there and push the mark along
+            after = sum(len(text) for text in formatted[i + 1:])
+            self.text_area.mark_set("stream", f"end-{after + 2}c")
+
+    def on_transcript_scroll(self, first, last):
+        self.text_area.vbar.set(first, last)
+        if float(first) == 0.0 and float(last) < 1.0:
+            self.root.after_idle(self.restore_older_messages)
+
+    def restore_older_messages(self):
+        if float(self.text_area.yview()[0]) != 0.0:
+            return
+        older = self.transcript.restore_previous()
+        if not older:
+            return
+        text = "".join(self.format_message(*m) for m in older)
+        self.text_area.config(state=tk.NORMAL)
+        self.text_area.insert(1.0, text)
+        self.text_area.config(state=tk.DISABLED)
+        # keep the message that was at the top in view
+        self.text_area.yview(f"{text.count(chr(10)) + 1}.0")
+        self.status_var.set("Loaded earlier messages.")
+
+    def search_history(self):
+        term = simpledialog.askstring("Search History", "Search the whole conversation for:", parent=self.root)
+        if not term:
+            return
+        results = self.transcript.search(term, limit=20)
+        if results:
+            messagebox.showinfo("Search History", "".join(self.format_message(*m) for m in results))
+        else:
+            messagebox.showinfo("Search History", f"No messages contain '{term}'.")
 
     def clear_chat(self):
+        self.transcript.clear()
         self.text_area.config(state=tk.NORMAL)
         self.text_area.delete(1.0, tk.END)
         self.text_area.config(state=tk.DISABLED)
@@ -182,7 +303,8 @@ class ChatApplication:
         file_path = filedialog.asksaveasfilename(defaultextension=".txt", filetypes=[("Text files", "*.txt")])
         if file_path:
             with open(file_path, "w", encoding="utf-8") as f:
-                f.write(self.text_area.get(1.0, tk.END))
+                for sender, message in self.transcript.iter_all():
+                    f.write(self.format_message(sender, message))
             self.status_var.set("Chat saved to " + file_path)
 
     def change_font_size(self, *args):
@@ -197,39 +319,69 @@ class ChatApplication:
         messagebox.showinfo("About", "NSFAS Chatbot that helps student with day-to-day NSFAS related question and provide prompt answers, reducing high volume calls at the call center")
 
     def close(self):
+        if self.chat_client:
+            self.chat_client.close()
         self.root.quit()
 
     def start_chatbot_process(self):
-        self.chatbot_process = subprocess.Popen(
-            ["python", "chat.py"],
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            text=True,
-            bufsize=1
-        )
+        # messages go to the shared chat server through one worker thread, in order
+        self.chat_client = None
+        self.outgoing = queue.Queue()
         threading.Thread(target=self.read_from_chatbot, daemon=True).start()
 
     def read_from_chatbot(self):
-        for line in self.chatbot_process.stdout:
-            self.insert_message("NSFAS Chatbot", line.strip())
+        self.post("message", "NSFAS Chatbot", "Before we start, may I have your name?")
+        user_name = self.outgoing.get()
+        self.post("message", "NSFAS Chatbot", "Please enter your email address:")
+        user_email = self.outgoing.get()
+        try:
+            self.chat_client = connect()
+            self.post("message", "NSFAS Chatbot", self.chat_client.start(user_name, user_email))
+        except OSError:
+            self.post("status", "Could not reach the chatbot server.")
+            return
+        while True:
+            message = self.outgoing.get()
+            try:
+                if isinstance(message, tuple):
+                    self.post_document(message[1], self.chat_client.upload(message[1]))
+                    continue
+                streamed = []
+                def on_chunk(chunk):
+                    if not streamed:
+                        self.post("stream_start", "NSFAS Chatbot")
+                    streamed.append(chunk)
+                    self.post("chunk", chunk)
+                replies = self.chat_client.send(message, on_chunk=on_chunk)
+            except RuntimeError as e:
+                # the server could not answer this message, the connection is still open
+                if streamed:
+                    self.post("stream_end")
+                self.post("status", f"Could not answer: {e}")
+                self.post("message", "NSFAS Chatbot", "Sorry, I could not answer that right now. Please try again.")
+                continue
+            except OSError:
+                self.post("status", "Lost connection to the chatbot server.")
+                return
+            if streamed:
+                # the streamed answer is already in the transcript
+                self.post("stream_end")
+                replies = replies[1:]
+            for reply in replies:
+                self.post("message", "NSFAS Chatbot", reply)
+
+    def post_document(self, file_path, document):
+        name = file_path.split('/')[-1]
+        if "pages" in document:
+            self.post("status", f"Indexed {name}: {document['pages']} pages")
+            self.post("message", "System", f"Document {name} uploaded and ready ({document['pages']} pages).")
+        else:
+            self.post("status", document["status"])
+            self.post("message", "System", f"Document {name} could not be used: {document['status']}")
 
     def voice_input(self):
-        recognizer = sr.Recognizer()
-        with sr.Microphone() as source:
-            self.status_var.set("Listening...")
-            try:
-                audio = recognizer.listen(source, timeout=15)
-                text = recognizer.recognize_google(audio)
-                self.input_var.set(text)
-                self.send_message()
-                self.status_var.set("Voice input recognized.")
-            except sr.WaitTimeoutError:
-                self.status_var.set("Listening timed out.")
-            except sr.UnknownValueError:
-                self.status_var.set("Could not understand.")
-            except sr.RequestError:
-                self.status_var.set("Speech service error.")
+        if not self.recognizer.listen():
+            self.status_var.set("Already listening...")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,201 @@
+import json
+import mmap
+import os
+import pickle
+import struct
+import numpy as np
+from documents import file_hash
+from fuzzy_matcher import FuzzyIndex, normalize
+from pattern_matcher import PatternMatcher
+
+# bumped whenever the pickled structures change layout, older files are recompiled
+MAGIC = b"NSFASBT3"
+ALIGN = 64
+ARTIFACT_FILE = "chatbot.bin"
+
+
+def _build_structures(intents, keyword_groups):
+    matcher = PatternMatcher()
+    for intent in intents['intents']:
+        matcher.add_all(intent["patterns"], "intent", intent)
+    for group, keywords in keyword_groups.items():
+        matcher.add_all(keywords, group)
+    matcher.build()
+
+    fuzzy = FuzzyIndex()
+    exact = {}
+    for intent in intents['intents']:
+        for pattern in intent["patterns"]:
+            exact.setdefault(normalize(pattern), intent["tag"])
+            fuzzy.add(pattern, intent["tag"])
+    fuzzy.build()
+    return {"matcher": matcher, "fuzzy": fuzzy, "exact": exact}
+
+
+def _source(path):
+    # freshness goes by content, the TorchScript export (inference.py) records the same hash
+    return {"sha256": file_hash(path)}
+
+
+def compile_artifact(keyword_groups, intents_path="intents.json", model_path="data.pth", out=ARTIFACT_FILE):
+    """
+    compile intents.json, data.pth and the matcher structures into one file:
+    MAGIC | meta length | pickled meta | padding | float32 weight arrays
+    the weights are stored raw and 64-byte aligned so they can be mmapped
+    """
+    import torch
+
+    with open(intents_path, 'r') as f:
+        intents = json.load(f)
+    data = torch.load(model_path)
+
+    arrays = {name: t.detach().cpu().numpy().astype(np.float32) for name, t in data["model_state"].items()}
+    table = {}
+    offset = 0
+    for name, arr in arrays.items():
+        table[name] = {"offset": offset, "shape": arr.shape}
+        offset += -(-arr.nbytes // ALIGN) * ALIGN
+
+    meta = {
+        "input_size": data["input_size"],
+        "hidden_size": data["hidden_size"],
+        "output_size": data["output_size"],
+        "all_words": data["all_words"],
+        "tags": data["tags"],
+        "intents": intents,
+        "keyword_groups": keyword_groups,
+        "sources": {path: _source(path) for path in (intents_path, model_path)},
+        "model_path": model_path,
+        "arrays": table,
+        # unpickled only when first used
+        "structures": pickle.dumps(_build_structures(intents, keyword_groups)),
+    }
+    blob = pickle.dumps(meta)
+    start = len(MAGIC) + 8 + len(blob)
+    start += -start % ALIGN
+
+    tmp = out + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(blob)))
+        f.write(blob)
+        f.write(b"\0" * (start - f.tell()))
+        for name, arr in arrays.items():
+            f.seek(start + table[name]["offset"])
+            f.write(arr.tobytes())
+    os.replace(tmp, out)
+    return out
+
+
+class Artifact:
+    """
+    read-only view of a compiled artifact
+    weights are numpy views over an mmap of the file, the matcher structures
+    are unpickled on first access and the torch model is only built on demand
+    """
+    def __init__(self, path=ARTIFACT_FILE):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._mmap[:len(MAGIC)] != MAGIC:
+            raise ValueError(f"{path} is not a chatbot artifact")
+        (meta_len,) = struct.unpack_from("<Q", self._mmap, len(MAGIC))
+        meta_start = len(MAGIC) + 8
+        meta = pickle.loads(self._mmap[meta_start:meta_start + meta_len])
+        data_start = meta_start + meta_len
+        data_start += -data_start % ALIGN
+
+        self.input_size = meta["input_size"]
+        self.hidden_size = meta["hidden_size"]
+        self.output_size = meta["output_size"]
+        self.all_words = meta["all_words"]
+        self.tags = meta["tags"]
+        self.intents = meta["intents"]
+        self.keyword_groups = meta["keyword_groups"]
+        self.sources = meta["sources"]
+        self.model_path = meta["model_path"]
+        self._structures_blob = meta["structures"]
+        self._structures = None
+        self.weights = {}
+        for name, info in meta["arrays"].items():
+            count = int(np.prod(info["shape"]))
+            arr = np.frombuffer(self._mmap, dtype=np.float32, count=count, offset=data_start + info["offset"])
+            self.weights[name] = arr.reshape(info["shape"])
+
+    def _structure(self, name):
+        if self._structures is None:
+            self._structures = pickle.loads(self._structures_blob)
+        return self._structures[name]
+
+    @property
+    def matcher(self):
+        return self._structure("matcher")
+
+    @property
+    def fuzzy_index(self):
+        return self._structure("fuzzy")
+
+    @property
+    def exact_patterns(self):
+        return self._structure("exact")
+
+    def is_stale(self, keyword_groups=None):
+        """
+        compiled from other intents, weights or keywords than the current ones
+        files are compared by content, a checkout, copy or touch keeps the artifact fresh
+        """
+        if keyword_groups is not None and keyword_groups != self.keyword_groups:
+            return True
+        for path, source in self.sources.items():
+            # artifacts from before content hashes recorded the mtime only
+            if not isinstance(source, dict) or not os.path.exists(path):
+                return True
+            if file_hash(path) != source["sha256"]:
+                return True
+        return False
+
+    def build_model(self, device=None):
+        """
+        NeuralNet with the artifact weights, in eval mode
+        """
+        import torch
+        from model import NeuralNet
+
+        model = NeuralNet(self.input_size, self.hidden_size, self.output_size)
+        model.load_state_dict({name: torch.from_numpy(np.array(arr)) for name, arr in self.weights.items()})
+        if device is not None:
+            model = model.to(device)
+        model.eval()
+        return model
+
+
+def load_artifact(keyword_groups, path=ARTIFACT_FILE, intents_path="intents.json", model_path="data.pth"):
+    """
+    load the compiled artifact, recompiling it first when it is missing
+    or out of date with intents.json / data.pth
+    compiling needs torch; a node without it keeps serving an out of date
+    artifact rather than failing to start
+    """
+    artifact = None
+    if os.path.exists(path):
+        try:
+            artifact = Artifact(path)
+        except ValueError:
+            # an older artifact format, compiled again below
+            artifact = None
+        if artifact is not None and not artifact.is_stale(keyword_groups):
+            return artifact
+    try:
+        compile_artifact(keyword_groups, intents_path, model_path, path)
+    except ImportError as e:
+        if artifact is None:
+            raise
+        print(f"{path} is out of date but cannot be recompiled here ({e}), using it as it is", flush=True)
+        return artifact
+    return Artifact(path)
+
+
+if __name__ == "__main__":
+    # chat owns the keyword lists, importing it may already refresh a stale artifact
+    from chat import KEYWORD_GROUPS
+    print(f"artifact saved to {compile_artifact(KEYWORD_GROUPS)}")
@@ -0,0 +1,115 @@
+import queue
+import re
+import threading
+
+
+class TTSWorker:
+    """
+    speaks queued text on its own thread so the Tk main loop never waits
+    - cancel() starts a new generation: everything queued before it is
+      dropped and the current utterance stops at its next word
+    - utterances of the current generation are never skipped, so every
+      sentence of a streamed answer is spoken in order
+    """
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._generation = 0
+        # generation of the utterance being spoken, None between utterances
+        self._speaking = None
+        self._lock = threading.Lock()
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def say(self, text):
+        with self._lock:
+            self._queue.put((self._generation, text))
+
+    def cancel(self):
+        # only flags the change, the engine is stopped on the worker thread
+        with self._lock:
+            self._generation += 1
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+
+    def _run(self):
+        import pyttsx3
+
+        # pyttsx3 engines must be used from the thread that created them
+        engine = pyttsx3.init()
+
+        # runs on this thread inside runAndWait, where stop() is allowed
+        def on_word(name, location, length):
+            if self._speaking != self._generation:
+                engine.stop()
+
+        engine.connect("started-word", on_word)
+        while True:
+            generation, text = self._queue.get()
+            if generation != self._generation:
+                continue
+            self._speaking = generation
+            engine.say(text)
+            engine.runAndWait()
+            self._speaking = None
+
+
+class SentenceBuffer:
+    """
+    collects a streamed answer and hands out the sentences completed so far,
+    so TTS can start on the first sentence while the rest is still arriving
+    a sentence ends at . ! or ? followed by whitespace
+    """
+    _END = re.compile(r"(?<=[.!?])\s+")
+
+    def __init__(self):
+        self._text = ""
+
+    def feed(self, chunk):
+        self._text += chunk
+        parts = self._END.split(self._text)
+        self._text = parts.pop()
+        return [p.strip() for p in parts if p.strip()]
+
+    def flush(self):
+        rest, self._text = self._text.strip(), ""
+        return rest
+
+
+class RecognizerWorker:
+    """
+    listens for speech on a background thread
+    results are put on the given queue as ("voice", text) or ("status", message)
+    """
+    def __init__(self, results, timeout=15):
+        self.results = results
+        self.timeout = timeout
+        self._busy = threading.Lock()
+
+    def listen(self):
+        if not self._busy.acquire(blocking=False):
+            return False
+        threading.Thread(target=self._listen, daemon=True).start()
+        return True
+
+    def _listen(self):
+        import speech_recognition as sr
+
+        try:
+            recognizer = sr.Recognizer()
+            with sr.Microphone() as source:
+                self.results.put(("status", "Listening..."))
+                audio = recognizer.listen(source, timeout=self.timeout)
+            self.results.put(("voice", recognizer.recognize_google(audio)))
+            self.results.put(("status", "Voice input recognized."))
+        except sr.WaitTimeoutError:
+            self.results.put(("status", "Listening timed out."))
+        except sr.UnknownValueError:
+            self.results.put(("status", "Could not understand."))
+        except sr.RequestError:
+            self.results.put(("status", "Speech service error."))
+        except OSError:
+            self.results.put(("status", "No microphone available."))
+        finally:
+            self._busy.release()
@@ -0,0 +1,163 @@
+"""
+answer a file of questions without the interactive loop
+
+    python batch.py questions.csv answers.jsonl [--workers 8] [--chunk 256] [--restart]
+
+questions come from JSON Lines, a JSON array (analytics_log.json) or CSV,
+one per record in a "question", "user_input" or "text" field; answers are
+appended to the output as JSON Lines, one chunk at a time, so an interrupted
+run picks up after the last chunk it finished; a question whose translation or
+Gemini call fails is written with "source": "error" and an "error" field
+"""
+import argparse
+import csv
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+QUESTION_FIELDS = ("question", "user_input", "text")
+
+
+def read_questions(path):
+    """
+    yield (index, id, question) for every record with a question
+    """
+    if path.lower().endswith(".csv"):
+        f = open(path, "r", encoding="utf-8", newline="")
+        records = csv.DictReader(f)
+    else:
+        from analytics import iter_records
+
+        f = None
+        records = iter_records(path)
+    try:
+        for index, record in enumerate(records):
+            question = next((record[k] for k in QUESTION_FIELDS if record.get(k)), None)
+            if question:
+                yield index, record.get("id", index), question
+    finally:
+        if f is not None:
+            f.close()
+
+
+def read_checkpoint(path):
+    """
+    input indexes already answered in an earlier run of the same output file
+    a last line cut short by a crash is removed, its question is answered again
+    """
+    done = set()
+    if not os.path.exists(path):
+        return done
+    good = 0
+    with open(path, "rb+") as f:
+        for line in f:
+            if not line.endswith(b"\n"):
+                break
+            try:
+                index = json.loads(line)["index"]
+            except (ValueError, KeyError):
+                break
+            done.add(index)
+            good += len(line)
+        f.truncate(good)
+    return done
+
+
+def chunked(items, size):
+    chunk = []
+    for item in items:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def batch_pipeline(chat):
+    """
+    chat.pipeline with escalations reported instead of creating tickets
+    """
+    def escalation(message):
+        if chat.wants_representative(message.text, chat.message_state(message)):
+            message.answer(["Escalation requested"], "ticket")
+
+    def escalation_batch(messages):
+        for message in messages:
+            escalation(message)
+
+    escalation.batch = escalation_batch
+    return chat.pipeline.replace("escalation", escalation)
+
+
+def guarded_map(pool):
+    """
+    pool.map for run_batch where a stage failing on one message (Gemini
+    blocking the answer, retries used up) only fails that message
+    """
+    def map_stage(stage, messages):
+        def call(message):
+            try:
+                stage(message)
+            except Exception as e:
+                message.error = f"{type(e).__name__}: {e}"
+                message.answer([None], "error")
+        return pool.map(call, messages)
+    return map_stage
+
+
+def answer_chunk(pipeline, questions, pool):
+    """
+    answer a list of questions, returns one (answer, source, language, error) per question
+    the pipeline runs over the whole chunk at once: stages with a batched
+    variant (matchers, one model batch, one retrieval matmul) take every
+    pending question in one call, translations and Gemini fallbacks go to the pool
+    a question whose remote call fails gets source "error" and the error, the rest go on
+    """
+    from pipeline import Message
+
+    messages = pipeline.run_batch([Message(question) for question in questions], guarded_map(pool))
+    return [(message.replies[0], message.source, message.language, message.error) for message in messages]
+
+
+def run(input_path, output_path, workers=8, chunk_size=256, resume=True):
+    import chat
+
+    pipeline = batch_pipeline(chat)
+    done = read_checkpoint(output_path) if resume else set()
+    mode = "a" if resume else "w"
+    todo = (record for record in read_questions(input_path) if record[0] not in done)
+    answered = 0
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool, open(output_path, mode, encoding="utf-8") as out:
+        for chunk in chunked(todo, chunk_size):
+            results = answer_chunk(pipeline, [question for index, id, question in chunk], pool)
+            for (index, id, question), (answer, source, language, error) in zip(chunk, results):
+                record = {"index": index, "id": id, "question": question, "answer": answer,
+                          "source": source, "language": language}
+                if error is not None:
+                    # written like any answer, so a resume does not stop at the same question again
+                    record["error"] = error
+                out.write(json.dumps(record) + "\n")
+            # the finished chunk is the checkpoint
+            out.flush()
+            os.fsync(out.fileno())
+            answered += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"{answered} answered ({len(done)} from an earlier run), {answered / elapsed:.1f}/s",
+                  file=sys.stderr, flush=True)
+    chat.response_cache.close()
+    return answered
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="answer a JSONL, JSON or CSV file of questions")
+    parser.add_argument("input")
+    parser.add_argument("output", help="answers as JSON Lines, also the checkpoint")
+    parser.add_argument("--workers", type=int, default=8, help="parallel Gemini calls")
+    parser.add_argument("--chunk", type=int, default=256, help="questions per local batch and checkpoint")
+    parser.add_argument("--restart", action="store_true", help="ignore answers already in the output")
+    args = parser.parse_args()
+    run(args.input, args.output, args.workers, args.chunk, resume=not args.restart)
@@ -0,0 +1,277 @@
+"""
+replay transcripts through the chat decision pipeline with a fake Gemini
+
+    python benchmark.py [--log analytics_log.jsonl] [--sessions 1,4,16] [--latency 0.2]
+
+reports per-stage latency histograms, throughput at N concurrent sessions
+and memory; nothing leaves the machine and the real response cache,
+analytics log and ticket database are not touched
+"""
+import argparse
+import json
+import os
+import resource
+import tempfile
+import threading
+import time
+import tracemalloc
+
+STAGES = ("escalation", "language", "nsfas_filter", "intent", "model", "retrieval", "fallback", "total")
+# histogram bucket upper bounds in microseconds
+BUCKETS_US = (10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 20000, 50000, 100000, 200000, 500000, 1000000)
+
+
+def load_messages(path=None, limit=None):
+    """
+    user inputs of an analytics log (JSON array or JSON Lines), or when there
+    is no log, a synthetic mix of intent patterns, paraphrases, other
+    languages, escalations and off-topic questions
+    """
+    from analytics import iter_records
+
+    candidates = [path] if path else ["analytics_log.jsonl", "analytics_log.json"]
+    for candidate in candidates:
+        if candidate and os.path.exists(candidate):
+            messages = [r["user_input"] for r in iter_records(candidate) if r.get("user_input")]
+            if messages:
+                return messages[:limit]
+    if path:
+        raise SystemExit(f"no user_input records in {path}")
+
+    with open("intents.json", "r") as f:
+        intents = json.load(f)
+    messages = []
+    for intent in intents["intents"]:
+        for pattern in intent["patterns"]:
+            messages.append(pattern)
+            messages.append(f"please tell me, {pattern.lower()}")
+    messages += [
+        "Ke batla go itse ka NSFAS",
+        "Ek wil weet hoe om vir NSFAS aansoek te doen",
+        "I want to speak to an NSFAS agent",
+        "Can you connect me with a representative",
+        "What is the weather like in Cape Town?",
+        "How much is the NSFAS allowance for books this year?",
+        "My NSFAS funding was rejected, what should I do?",
+        "Does NSFAS pay for private college accommodation?",
+    ]
+    return messages[:limit]
+
+
+def fake_reply(parts):
+    """
+    deterministic Gemini stand-in: echoes translations, answers everything else
+    with a fixed two-sentence reply
+    """
+    from language_id import DETECT_AND_TRANSLATE_PROMPT
+
+    if parts[0] == DETECT_AND_TRANSLATE_PROMPT:
+        return f"Language: unknown\nEnglish: {parts[1]}"
+    return "This is a fake NSFAS answer. It was generated locally."
+
+
+class StageTimer:
+    """
+    per-stage durations in nanoseconds, shared by the session threads
+    """
+    def __init__(self):
+        self.samples = {stage: [] for stage in STAGES}
+        self._lock = threading.Lock()
+
+    def record(self, stage, ns):
+        with self._lock:
+            self.samples.setdefault(stage, []).append(ns)
+
+    def timed(self, stage, func, *args):
+        start = time.perf_counter_ns()
+        result = func(*args)
+        self.record(stage, time.perf_counter_ns() - start)
+        return result
+
+
+def timed_pipeline(chat, timer):
+    """
+    chat.pipeline with every stage timed; escalations are answered
+    without creating a ticket
+    """
+    def escalation(message):
+        if chat.wants_representative(message.text, chat.message_state(message)):
+            message.answer(["Escalation requested"], "ticket")
+
+    return chat.pipeline.replace("escalation", escalation).map(
+        lambda name, stage: lambda message: timer.timed(name, stage, message))
+
+
+def replay_message(pipeline, text, timer):
+    """
+    run one message through the pipeline, returns where its answer came from
+    """
+    from pipeline import Message
+
+    start = time.perf_counter_ns()
+    try:
+        return pipeline.run(Message(text)).source
+    finally:
+        timer.record("total", time.perf_counter_ns() - start)
+
+
+def run_sessions(chat, messages, sessions):
+    """
+    replay the transcript in `sessions` threads at once, every thread
+    sends every message; returns (timer, outcome counts, elapsed seconds)
+    """
+    timer = StageTimer()
+    pipeline = timed_pipeline(chat, timer)
+    outcomes = {}
+    lock = threading.Lock()
+    barrier = threading.Barrier(sessions)
+
+    def session():
+        barrier.wait()
+        for text in messages:
+            outcome = replay_message(pipeline, text, timer)
+            with lock:
+                outcomes[outcome] = outcomes.get(outcome, 0) + 1
+
+    threads = [threading.Thread(target=session) for _ in range(sessions)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return timer, outcomes, time.perf_counter() - start
+
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return 0
+    return sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)]
+
+
+def summarize(samples_ns):
+    values = sorted(samples_ns)
+    us = [v / 1000 for v in values]
+    counts = [0] * (len(BUCKETS_US) + 1)
+    for v in us:
+        i = 0
+        while i < len(BUCKETS_US) and v > BUCKETS_US[i]:
+            i += 1
+        counts[i] += 1
+    return {
+        "count": len(us),
+        "mean_us": sum(us) / len(us) if us else 0,
+        "p50_us": percentile(us, 0.50),
+        "p90_us": percentile(us, 0.90),
+        "p99_us": percentile(us, 0.99),
+        "max_us": us[-1] if us else 0,
+        "histogram": counts,
+    }
+
+
+def _bucket_label(i):
+    bound = BUCKETS_US[i] if i < len(BUCKETS_US) else None
+    if bound is None:
+        return f">{BUCKETS_US[-1] / 1000:g}ms"
+    return f"<={bound}us" if bound < 1000 else f"<={bound / 1000:g}ms"
+
+
+def print_histograms(stats, width=40):
+    for stage in STAGES:
+        s = stats.get(stage)
+        if not s or not s["count"]:
+            continue
+        print(f"\n{stage}: n={s['count']} mean={s['mean_us']:.1f}us p50={s['p50_us']:.1f}us "
+              f"p90={s['p90_us']:.1f}us p99={s['p99_us']:.1f}us max={s['max_us']:.1f}us")
+        peak = max(s["histogram"])
+        for i, count in enumerate(s["histogram"]):
+            if count:
+                print(f"  {_bucket_label(i):>9} {count:7d} {'#' * max(1, round(width * count / peak))}")
+
+
+def max_rss_mb():
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="benchmark the chat pipeline with a fake Gemini backend")
+    parser.add_argument("--log", help="analytics log to replay (default: analytics_log.jsonl, a synthetic set if missing)")
+    parser.add_argument("--messages", type=int, help="replay at most this many messages per session")
+    parser.add_argument("--sessions", default="1,4,16", help="comma separated concurrent session counts")
+    parser.add_argument("--latency", type=float, default=0.2, help="fake Gemini latency in seconds")
+    parser.add_argument("--json", help="also write the results to this file")
+    args = parser.parse_args(argv)
+
+    rss_start = max_rss_mb()
+    start = time.perf_counter()
+    import chat
+    from llm_client import FakeBackend, LLMClient
+    from response_cache import ResponseCache
+
+    import_s = time.perf_counter() - start
+    messages = load_messages(args.log, args.messages)
+    levels = [int(n) for n in args.sessions.split(",")]
+    tmp = tempfile.mkdtemp(prefix="nsfas-bench-")
+
+    backend = FakeBackend(fake_reply, latency=args.latency)
+    chat.llm = LLMClient(backend)
+    results = {"messages": len(messages), "latency": args.latency, "import_s": import_s, "levels": []}
+    print(f"{len(messages)} messages, fake Gemini latency {args.latency * 1000:.0f}ms, import chat {import_s:.2f}s")
+
+    for i, sessions in enumerate(levels):
+        # a fresh response cache per level, so every level starts cold
+        chat.response_cache = ResponseCache(path=os.path.join(tmp, f"cache{i}.db"),
+                                             featurizer=chat.state.intent_engine.featurizer)
+        calls_before = backend.calls
+        timer, outcomes, elapsed = run_sessions(chat, messages, sessions)
+        stats = {stage: summarize(samples) for stage, samples in timer.samples.items()}
+        total = stats["total"]["count"]
+        level = {
+            "sessions": sessions,
+            "messages": total,
+            "elapsed_s": elapsed,
+            "throughput": total / elapsed if elapsed else 0.0,
+            "llm_calls": backend.calls - calls_before,
+            "outcomes": outcomes,
+            "stages": stats,
+        }
+        results["levels"].append(level)
+        chat.response_cache.close()
+
+    print(f"\n{'sessions':>8} {'msgs':>7} {'msg/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'LLM calls':>10}")
+    for level in results["levels"]:
+        t = level["stages"]["total"]
+        print(f"{level['sessions']:>8} {level['messages']:>7} {level['throughput']:>9.1f} "
+              f"{t['p50_us'] / 1000:>8.2f} {t['p99_us'] / 1000:>8.2f} {level['llm_calls']:>10}")
+    first = results["levels"][0]
+    print(f"\noutcomes ({first['sessions']} session): {first['outcomes']}")
+    print(f"per-stage latency ({first['sessions']} session):")
+    print_histograms(first["stages"])
+
+    # Python heap while replaying once more, traced separately since tracing slows everything down
+    chat.response_cache = ResponseCache(path=os.path.join(tmp, "cache-mem.db"),
+                                         featurizer=chat.state.intent_engine.featurizer)
+    tracemalloc.start()
+    run_sessions(chat, messages, 1)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    chat.response_cache.close()
+    results["memory"] = {
+        "rss_before_import_mb": rss_start,
+        "max_rss_mb": max_rss_mb(),
+        "replay_heap_peak_mb": peak / 2 ** 20,
+        "replay_heap_retained_mb": current / 2 ** 20,
+    }
+    m = results["memory"]
+    print(f"\nmemory: max RSS {m['max_rss_mb']:.1f}MB (before import {m['rss_before_import_mb']:.1f}MB), "
+          f"replay heap peak {m['replay_heap_peak_mb']:.2f}MB, retained {m['replay_heap_retained_mb']:.2f}MB")
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"results saved to {args.json}")
+    return results
+
+
+if __name__ == "__main__":
+    main()
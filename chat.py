@@ -1,40 +1,107 @@
 import random
-import json
-import torch
 import datetime
-import os
-import google.generativeai as genai
-from model import NeuralNet
-from nltk_utils import bag_of_words, tokenize
+import threading
+import time
+from artifact import load_artifact
+from inference import load_backend
+from intent_engine import IntentEngine
+from llm_client import GeminiBackend, LLMClient
+from response_cache import ResponseCache
+from analytics import AnalyticsWriter
+from documents import DocumentIngestor, DocumentStore, inspect_document
+from retrieval import RetrievalIndex
+from tickets import TicketStore
+from language_id import LanguageIdentifier, DETECT_AND_TRANSLATE_PROMPT, parse_language_translation
+from pipeline import Message, Pipeline
+from metrics import REGISTRY, current_trace, set_source, span, trace
+from nltk_utils import warm_cache
 
-# Set device for PyTorch
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+bot_name = "NSFAS CHATBOT"
+NSFAS_KEYWORDS = ["nsfas", "funding", "bursary", "loan", "allowance", "scholarship", "application", "university", "college", "financial aid"]
+INTERN_KEYWORDS = ["speak to", "talk to", "connect me", "chat with", "reach out"]
+TARGET_KEYWORDS = ["intern", "official", "nsfas staff", "nsfas agent", "representative"]
+KEYWORD_GROUPS = {"nsfas": NSFAS_KEYWORDS, "intern": INTERN_KEYWORDS, "target": TARGET_KEYWORDS}
 
-# Load intents
-with open('intents.json', 'r') as json_data:
-    intents = json.load(json_data)
+# Model backends in order of preference, the first one that loads is used:
+# the NumPy forward pass needs no torch import and is the fastest on CPU for
+# this small network; "torchscript" is the int8 export of inference.py
+MODEL_BACKENDS = ("numpy", "torchscript", "torch")
 
-# Load trained model
-FILE = "data.pth"
-data = torch.load(FILE)
+# BotState.warm() also pre-fills the tokenize/stem caches from the intent patterns
+WARM_TOKEN_CACHE = True
 
-input_size = data["input_size"]
-hidden_size = data["hidden_size"]
-output_size = data["output_size"]
-all_words = data["all_words"]
-tags = data["tags"]
-model_state = data["model_state"]
+# Everything derived from intents.json and data.pth, replaced as one object on reload
+# a message pins `state` when its first stage runs (message_state), so every stage
+# of that message uses the same model and matcher even if a reload happens meanwhile
+class BotState:
+    def __init__(self, artifact):
+        self.artifact = artifact
+        self.intents = artifact.intents
+        self.all_words = artifact.all_words
+        self.tags = artifact.tags
+        self.intent_engine = IntentEngine(None, self.all_words, self.tags, model_loader=self.load_model)
+        self.responses_by_tag = {intent["tag"]: intent["responses"] for intent in self.intents["intents"]}
+        # One automaton for intent patterns, NSFAS keywords and escalation keywords
+        self.matcher = artifact.matcher
+        self.retrieval_index = None
+        self.retrieval_lock = threading.Lock()
 
-model = NeuralNet(input_size, hidden_size, output_size).to(device)
-model.load_state_dict(model_state)
-model.eval()
+    # Pick the model backend when the model is first needed
+    def load_model(self):
+        return load_backend(self.artifact, MODEL_BACKENDS)
 
-bot_name = "NSFAS CHATBOT"
-NSFAS_KEYWORDS = ["nsfas", "funding", "bursary", "loan", "allowance", "scholarship", "application", "university", "college", "financial aid"]
-analytics_log = []
+    # Local retrieval over the intent responses, built on first use
+    # uploaded documents are indexed per ChatSession, never here
+    def get_retrieval_index(self):
+        with self.retrieval_lock:
+            if self.retrieval_index is None:
+                index = RetrievalIndex()
+                index.add_intents(self.intents)
+                self.retrieval_index = index.build()
+        return self.retrieval_index
+
+    # Load the model and the matcher now rather than on the first message
+    def warm(self):
+        self.intent_engine.model
+        self.matcher.longest("", "intent")
+        if WARM_TOKEN_CACHE:
+            warm_cache(self.intents)
+        return self
+
+# Load intents, vocabulary, tags, weights and matchers from the compiled artifact
+# (recompiled from intents.json and data.pth when they change)
+state = BotState(load_artifact(KEYWORD_GROUPS))
+# held while swapping the state
+state_lock = threading.Lock()
+
+response_cache = ResponseCache(featurizer=state.intent_engine.featurizer)
+analytics_writer = AnalyticsWriter()
+ticket_store = TicketStore()
+document_ingestor = DocumentIngestor()
+REGISTRY.gauge("nsfas_response_cache_hit_rate", "share of Gemini fallbacks answered from the response cache",
+               lambda: response_cache.stats()["hit_rate"])
 
-# Google Gemini setup
-genai.configure(api_key="Write your Gemini code here") 
+RETRIEVAL_ANSWER_SCORE = 0.5
+RETRIEVAL_CONTEXT_SCORE = 0.1
+
+# the BotState a message is answered with
+def message_state(message):
+    if message.state is None:
+        message.state = state
+    return message.state
+
+# Hot reload after intents.json or data.pth changed (see hot_reload.py):
+# the new state is fully loaded before it replaces the old one
+def reload_state():
+    global state
+    new_state = BotState(load_artifact(KEYWORD_GROUPS)).warm()
+    new_state.get_retrieval_index()
+    with state_lock:
+        state = new_state
+    response_cache.set_featurizer(new_state.intent_engine.featurizer)
+    return new_state
+
+# Google Gemini setup, imported and configured on the first fallback
 generation_config = {
     "temperature": 1,
     "top_p": 0.95,
@@ -42,115 +109,352 @@ generation_config = {
     "max_output_tokens": 100,
     "response_mime_type": "text/plain",
 }
-gemini_model = genai.GenerativeModel(
-    model_name="gemini-1.5-flash",
-    generation_config=generation_config,
-)
-
-def GenerateResponse(input_text):
-    response = gemini_model.generate_content([
-        "You are an NSFAS chatbot. Answer in exactly two sentences.",
+
+def make_gemini_model():
+    import google.generativeai as genai
+    genai.configure(api_key="Write your Gemini code here")
+    return genai.GenerativeModel(
+        model_name="gemini-1.5-flash",
+        generation_config=generation_config,
+    )
+
+llm = LLMClient(GeminiBackend(model_factory=make_gemini_model))
+language_identifier = LanguageIdentifier()
+REGISTRY.gauge("nsfas_llm_requests", "Gemini requests made by the pipeline", lambda: llm.stats()["requests"])
+REGISTRY.gauge("nsfas_llm_coalesced", "Gemini requests answered by an identical call already in flight",
+               lambda: llm.stats()["coalesced"])
+
+LLM_FIRST_CHUNK = REGISTRY.histogram("nsfas_llm_first_chunk_seconds", "time to the first chunk of a streamed answer")
+
+# with on_chunk, the answer is streamed and on_chunk gets every piece as it arrives
+def GenerateResponse(input_text, context=None, on_chunk=None):
+    parts = ["You are an NSFAS chatbot. Answer in exactly two sentences."]
+    if context:
+        parts.append("Use this NSFAS information if it is relevant:\n" + "\n".join(context))
+    parts += [
         f"Question: {input_text}",
         "Answer: ",
-    ])
-    return response.text.strip()
-
-def translate_to_english(text):
-    response = gemini_model.generate_content([
-        "Translate this to English, but keep any NSFAS terms unchanged:",
-        text
-    ])
-    return response.text.strip()
-
-def detect_language(text):
-    response = gemini_model.generate_content(["Identify the language of this text. Just return the name of this language", text])
-    return response.text.strip().lower()
-
-def is_nsfas_related(question):
-    question_lower = question.lower()
-    return any(keyword in question_lower for keyword in NSFAS_KEYWORDS)
-
-def log_interaction(user_input, response, used_gemini):
-    analytics_log.append({
+    ]
+    with span("generate_response"):
+        if on_chunk is None:
+            return llm.generate_sync(parts)
+        chunks = []
+        start = time.perf_counter()
+        for chunk in llm.stream_sync(parts):
+            if not chunks:
+                LLM_FIRST_CHUNK.observe(time.perf_counter() - start)
+                chunk = chunk.lstrip()
+            chunks.append(chunk)
+            on_chunk(chunk)
+        return "".join(chunks).strip()
+
+# Local language id first, one combined Gemini call only for non-English input
+def detect_and_translate(text):
+    with span("detect_language"):
+        language = language_identifier.detect(text)
+    if language == "english":
+        return language, text
+    with span("translate_to_english"):
+        detected, english = parse_language_translation(llm.generate_sync([DETECT_AND_TRANSLATE_PROMPT, text]))
+    language = language or detected
+    if language == "english":
+        return language, text
+    return language, english
+
+# helpers below take the BotState to use, the current one by default
+def is_nsfas_related(question, current=None):
+    with span("is_nsfas_related"):
+        return "nsfas" in (current or state).matcher.groups(question)
+
+def wants_representative(user_input, current=None):
+    with span("escalation"):
+        groups = (current or state).matcher.groups(user_input)
+    return "intern" in groups and "target" in groups
+
+def log_interaction(user_input, response, used_gemini, cache=None):
+    entry = {
         "timestamp": datetime.datetime.now().isoformat(),
         "user_input": user_input,
         "response": response,
         "used_gemini": used_gemini
-    })
+    }
+    # "hit", "near_hit" or "miss" whenever the answer went through the response cache
+    if cache:
+        entry["cache"] = cache
+    # where the answer came from and the stages timed so far for this message
+    t = current_trace()
+    if t is not None:
+        entry["source"] = t.source
+        entry["stages_ms"] = t.stages_ms()
+    analytics_writer.write(entry)
+
+DOCUMENT_LABELS = {"pdf": "PDF", "markdown": "Markdown document", "text": "text document"}
 
 def verify_document(filepath):
-    if filepath.endswith('.pdf'):
-        return {"status": "Received PDF", "verified": False}
+    info = inspect_document(filepath)
+    if not info["valid"]:
+        return {"status": "Unsupported or unreadable document", "verified": False}
+    return {"status": f"Received {DOCUMENT_LABELS[info['type']]}", "verified": False}
+
+# Extract and chunk a document in the process pool, returns a Future
+def ingest_document(filepath):
+    return document_ingestor.submit(filepath)
+
+# The chunks go to the uploading session only, other students never see them
+def add_document(document, session):
+    session.add_document(document)
+    return {"name": document["name"], "pages": document["pages"],
+            "chunks": len(document["chunks"]), "cached": document["cached"]}
 
 # Check for intent response
-def get_first_intent_response(user_input):
-    for intent in intents['intents']:
-        for pattern in intent["patterns"]:
-            if pattern.lower() in user_input.lower():
-                return random.choice(intent["responses"])
+# pick chooses among the responses of the matched intent
+def get_first_intent_response(user_input, pick=random.choice, current=None):
+    with span("intent_match"):
+        match = (current or state).matcher.longest(user_input, "intent")
+    if match:
+        return pick(match.value["responses"])
     return None
 
-# Get chatbot response: intent first, Gemini fallback
+# Get model response: None when the model is not confident enough
+def get_model_response(sentence, current=None):
+    current = current or state
+    with span("model_inference"):
+        tag, prob = current.intent_engine.classify(sentence)
+    if tag is None or tag not in current.responses_by_tag:
+        return None
+    return random.choice(current.responses_by_tag[tag])
+
+# Gemini fallback behind the persistent response cache
+# returns (response, cache) with cache "hit", "near_hit" or "miss"
+# on_miss is called before the (slow) Gemini call, on_chunk streams its answer
+# private: the context holds passages of the student's own documents, the answer
+# may repeat them, so it bypasses the shared cache (cache is None)
+def get_cached_response(sentence, context=None, on_miss=None, on_chunk=None, private=False):
+    response, cache = None, None
+    if not private:
+        with span("response_cache"):
+            response, cache = response_cache.get(sentence)
+    if response is None:
+        if on_miss is not None:
+            on_miss()
+        response = GenerateResponse(sentence, context, on_chunk)
+        if not private:
+            with span("response_cache"):
+                response_cache.put(sentence, response)
+    return response, cache
+
+# Local retrieval: (answer, [], False) for a confident hit, otherwise
+# (None, top passages for Gemini, whether any of them comes from the session's own documents)
+# with a session, its own uploaded documents are searched too
+def get_retrieved_response(sentence, session=None, current=None):
+    with span("retrieval"):
+        hits = (current or state).get_retrieval_index().search(sentence, k=3)
+        if session is not None:
+            hits = sorted(hits + session.search_documents(sentence, k=3), key=lambda hit: -hit[1])[:3]
+    return retrieval_result(hits)
+
+def retrieval_result(hits):
+    if hits and hits[0][1] >= RETRIEVAL_ANSWER_SCORE:
+        return hits[0][0]["text"], [], False
+    passages = [passage for passage, score in hits if score >= RETRIEVAL_CONTEXT_SCORE]
+    private = any(passage["source"].startswith("document:") for passage in passages)
+    return None, [passage["text"] for passage in passages], private
+
+# Pipeline stages: each one either answers the message or leaves it for the next
+def escalation_stage(message):
+    if not wants_representative(message.text, message_state(message)):
+        return
+    session = message.session
+    ticket_data = ticket_store.create(session.user_name, session.user_email, message.text)
+    ticket_number = ticket_data["ticket_number"]
+    message.answer([f"Your request has been submitted. Ticket Number: {ticket_number}",
+                    "An NSFAS representative will contact you via email soon."],
+                   "ticket", response=f"Ticket created: {ticket_number}")
+
+def language_stage(message):
+    message.language, message.english = detect_and_translate(message.text)
+
+def nsfas_filter_stage(message):
+    if not is_nsfas_related(message.english, message_state(message)):
+        message.answer(["Sorry, I can only answer NSFAS-related questions."], "unrelated",
+                       response="Unrelated to NSFAS")
+
+def intent_stage(message):
+    response = get_first_intent_response(message.english, current=message_state(message))
+    if response:
+        message.answer([response], "intent")
+
+def model_stage(message):
+    response = get_model_response(message.english, message_state(message))
+    if response:
+        message.answer([response], "model")
+
+def retrieval_stage(message):
+    answer, message.context, message.private_context = get_retrieved_response(
+        message.english, message.session, message_state(message))
+    if answer:
+        message.answer([answer], "retrieval")
+
+def fallback_stage(message):
+    response, cache = get_cached_response(
+        message.english, message.context,
+        on_miss=lambda: message.progress("Give me few seconds, let me get more info..."),
+        on_chunk=message.on_chunk, private=message.private_context)
+    message.answer([response], "cache" if cache in ("hit", "near_hit") else "gemini", cache=cache)
+
+# Batched variants for Pipeline.run_batch (batch.py): one call for all the
+# messages still unanswered at that stage, with the same outcome per message;
+# the cheap local stages just loop in the calling thread instead of the pool
+def by_state(messages):
+    groups = {}
+    for message in messages:
+        current = message_state(message)
+        groups.setdefault(id(current), (current, []))[1].append(message)
+    return groups.values()
+
+def intent_batch(messages):
+    for message in messages:
+        intent_stage(message)
+
+def nsfas_filter_batch(messages):
+    for message in messages:
+        nsfas_filter_stage(message)
+
+def model_batch(messages):
+    for current, group in by_state(messages):
+        with span("model_inference"):
+            predictions = current.intent_engine.classify_batch([m.english for m in group])
+        for message, (tag, prob) in zip(group, predictions):
+            if tag in current.responses_by_tag:
+                message.answer([random.choice(current.responses_by_tag[tag])], "model")
+
+def retrieval_batch(messages):
+    # a session's own documents are searched per message
+    for message in messages:
+        if message.session is not None:
+            retrieval_stage(message)
+    shared = [message for message in messages if message.session is None]
+    for current, group in by_state(shared):
+        with span("retrieval"):
+            hits = current.get_retrieval_index().search_batch([m.english for m in group], k=3)
+        for message, hit in zip(group, hits):
+            answer, message.context, message.private_context = retrieval_result(hit)
+            if answer:
+                message.answer([answer], "retrieval")
+
+nsfas_filter_stage.batch = nsfas_filter_batch
+intent_stage.batch = intent_batch
+model_stage.batch = model_batch
+retrieval_stage.batch = retrieval_batch
+
+# The one message pipeline behind the chat server, the CLIs, the GUI, the benchmark and batch.py
+pipeline = Pipeline([
+    ("escalation", escalation_stage),
+    ("language", language_stage),
+    ("nsfas_filter", nsfas_filter_stage),
+    ("intent", intent_stage),
+    ("model", model_stage),
+    ("retrieval", retrieval_stage),
+    ("fallback", fallback_stage),
+])
+
+# Get chatbot response with the cache status of the Gemini fallback (None if not used)
+# the sentence is already English and NSFAS related: intent, model, retrieval, Gemini
+def get_chatbot_response_with_cache(sentence):
+    message = pipeline.starting_at("intent").run(Message(sentence))
+    return message.response, message.cache
+
+# Get chatbot response: intent first, then model, Gemini fallback
 def get_chatbot_response(sentence):
-    intent_response = get_first_intent_response(sentence)
-    if intent_response:
-        return intent_response
-    else:
-        return GenerateResponse(sentence)
+    return get_chatbot_response_with_cache(sentence)[0]
+
+# One student's conversation: name, email and message history
+# pipeline defaults to the shared one, read per message so it can be swapped
+class ChatSession:
+    def __init__(self, user_name, user_email, pipeline=None):
+        self.user_name = user_name
+        self.user_email = user_email
+        self.pipeline = pipeline
+        self.history = []
+        self.last_message = None
+        # documents this student uploaded, searched for their messages only
+        self.documents = DocumentStore()
+        self.document_index = RetrievalIndex()
+        self.document_lock = threading.Lock()
+
+    def greeting(self):
+        return f"Hello {self.user_name}, how can I assist you with NSFAS today?"
 
-# Main chatbot logic
+    def add_document(self, document):
+        with self.document_lock:
+            if self.documents.add(document):
+                self.document_index.add_chunks({"document": document["name"], **chunk}
+                                               for chunk in document["chunks"])
+                self.document_index.build()
+
+    def search_documents(self, sentence, k=3):
+        return self.document_index.search(sentence, k)
+
+    # Main chatbot logic: returns the reply lines for one message
+    # every message is one trace: its spans go to the metrics and its analytics record
+    # with on_chunk, a Gemini answer is also streamed to it (it is still the first reply)
+    def handle(self, user_input, on_progress=None, on_chunk=None):
+        with trace():
+            message = (self.pipeline or pipeline).run(Message(user_input, self, on_progress, on_chunk))
+            set_source(message.source)
+            with span("output"):
+                log_interaction(user_input, message.response, used_gemini=(message.source == "gemini"),
+                                cache=message.cache)
+                self.history.append((user_input, message.replies))
+        self.last_message = message
+        return message.replies
+
+# Command line client of the chat server (started on demand)
 def chat():
+    from chat_server import connect
+
     user_name = input("Before we start, may I have your name? ")
     user_email = input("Please enter your email address: ")
-    print(f"Hello {user_name}, how can I assist you with NSFAS today?")
+    try:
+        client = connect()
+        print(client.start(user_name, user_email))
+    except OSError as e:
+        print(f"NSFAS Chatbot: Sorry, the chat service is not available right now ({e}). Please try again later.")
+        return
     print("Type 'quit' to exit.")
 
     while True:
         user_input = input(f"{user_name}: ")
         if user_input.lower() == "quit":
             break
-
-        intern_keywords = ["speak to", "talk to", "connect me", "chat with", "reach out"]
-        target_keywords = ["intern", "official", "nsfas staff", "nsfas agent", "representative"]
-
-        if (any(word in user_input.lower() for word in intern_keywords) and
-            any(role in user_input.lower() for role in target_keywords)):
-
-            ticket_number = f"TKT-{datetime.datetime.now().strftime('%Y%m%d%H%M%S')}"
-            ticket_data = {
-                "ticket_number": ticket_number,
-                "student_name": user_name,
-                "email": user_email,
-                "question": user_input,
-                "timestamp": datetime.datetime.now().isoformat()
-            }
-
-            with open("pending_tickets.json", "a") as f:
-                json.dump(ticket_data, f)
-                f.write("\n")
-
-            print(f"NSFAS Chatbot: Your request has been submitted. Ticket Number: {ticket_number}")
-            print("NSFAS Chatbot: An NSFAS representative will contact you via email soon.")
-            log_interaction(user_input, f"Ticket created: {ticket_number}", used_gemini=False)
+        # a Gemini answer is printed as it streams in, the other replies when they are complete
+        streamed = []
+        def show(chunk):
+            if not streamed:
+                print("NSFAS Chatbot: ", end="")
+            streamed.append(chunk)
+            print(chunk, end="", flush=True)
+        try:
+            replies = client.send(user_input, on_chunk=show)
+        except RuntimeError as e:
+            # the server could not answer this one, the session is still open
+            if streamed:
+                print()
+            print(f"NSFAS Chatbot: Sorry, I could not answer that right now ({e}). Please try again.")
             continue
+        except OSError as e:
+            # the server went away or stopped answering, the session is gone with it
+            if streamed:
+                print()
+            print(f"NSFAS Chatbot: Sorry, the connection to the chat service was lost ({e}). Please start a new session.")
+            break
+        if streamed:
+            print()
+            replies = replies[1:]
+        for reply in replies:
+            print(f"NSFAS Chatbot: {reply}")
 
-        detected_input = detect_language(user_input)
-        if detected_input != "english":
-            translated_input = translate_to_english(user_input)
-        else:
-            translated_input = user_input
-
-        if not is_nsfas_related(translated_input):
-            print("NSFAS Chatbot: Sorry, I can only answer NSFAS-related questions.")
-            log_interaction(user_input, "Unrelated to NSFAS", used_gemini=False)
-            continue
-
-        bot_response = get_chatbot_response(translated_input)
-        print(f"NSFAS Chatbot: {bot_response}")
-        log_interaction(user_input, bot_response, used_gemini=("NSFAS CHATBOT (GEMINI):" in bot_response))
-
-    with open("analytics_log.json", "w") as f:
-        json.dump(analytics_log, f, indent=4)
+    client.close()
     print("Session ended. Thank you!")
 
 if __name__ == "__main__":
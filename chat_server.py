@@ -0,0 +1,171 @@
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+HOST = "127.0.0.1"
+PORT = 8765
+
+
+# Server: loads the model, intents and Gemini client once for every session
+#
+# protocol, one JSON object per line in each direction:
+#   -> {"type": "start", "name": ..., "email": ...}   <- {"greeting": ...}
+#   -> {"type": "message", "text": ...}               <- {"replies": [...]}
+#      with "stream": true, a Gemini answer first arrives as {"chunk": ...} lines,
+#      then again in full as the first reply
+#   -> {"type": "document", "path": ...}              <- {"document": {...}}
+# each connection is one ChatSession
+async def handle_connection(reader, writer):
+    import chat
+
+    session = None
+    loop = asyncio.get_running_loop()
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            request = json.loads(line)
+            try:
+                if request.get("type") == "start":
+                    session = chat.ChatSession(request.get("name", ""), request.get("email", ""))
+                    response = {"greeting": session.greeting()}
+                elif session is None:
+                    response = {"error": "session not started"}
+                elif request.get("type") == "document":
+                    path = request.get("path", "")
+                    check = chat.verify_document(path)
+                    response = {"document": check}
+                    if chat.inspect_document(path)["valid"]:
+                        try:
+                            # extraction runs in a process pool, other sessions keep going
+                            document = await asyncio.wrap_future(chat.ingest_document(path))
+                            response = {"document": {**chat.add_document(document, session), **check}}
+                        except Exception as e:
+                            response = {"document": {"status": f"Could not read document: {e}", "verified": False}}
+                else:
+                    on_chunk = None
+                    if request.get("stream"):
+                        # chunks come from the executor thread, the loop writes them in order
+                        def on_chunk(chunk):
+                            line = (json.dumps({"chunk": chunk}) + "\n").encode("utf-8")
+                            loop.call_soon_threadsafe(writer.write, line)
+                    # the pipeline is synchronous, run it off the event loop
+                    replies = await loop.run_in_executor(None, session.handle, request.get("text", ""), None, on_chunk)
+                    response = {"replies": replies}
+            except Exception as e:
+                # one failed request (e.g. Gemini unreachable) is reported, the session goes on
+                print(f"request failed: {e!r}", file=sys.stderr, flush=True)
+                response = {"error": f"could not answer: {e}"}
+            writer.write((json.dumps(response) + "\n").encode("utf-8"))
+            await writer.drain()
+    except (ConnectionError, json.JSONDecodeError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve(host=HOST, port=PORT):
+    import chat  # load everything before accepting sessions
+    from hot_reload import watch
+    from metrics import METRICS_PORT, serve_metrics
+
+    # model, matcher and token caches ready before the first student arrives
+    chat.state.warm()
+    # tickets of the old append-only pending_tickets.json, moved over once
+    imported = chat.ticket_store.import_json_lines()
+    if imported:
+        print(f"imported {imported} tickets from pending_tickets.json", flush=True)
+
+    # retrain and reload in the background when intents.json or data.pth change
+    watch()
+    # Prometheus text metrics on http://127.0.0.1:9108/metrics
+    serve_metrics(host, METRICS_PORT)
+    server = await asyncio.start_server(handle_connection, host, port)
+    print(f"{chat.bot_name} server listening on {host}:{port}", flush=True)
+    async with server:
+        await server.serve_forever()
+
+
+# Client: what chat() and the GUI use, no model or Gemini imports here
+class ChatClient:
+    def __init__(self, host=HOST, port=PORT, timeout=60):
+        self.sock = socket.create_connection((host, port), timeout=timeout)
+        self.file = self.sock.makefile("rw", encoding="utf-8", newline="\n")
+
+    def _request(self, request):
+        self.file.write(json.dumps(request) + "\n")
+        self.file.flush()
+        return self._response()
+
+    def _response(self):
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("chat server closed the connection")
+        response = json.loads(line)
+        if "error" in response:
+            # the request failed, the connection is still usable
+            raise RuntimeError(response["error"])
+        return response
+
+    def start(self, name, email):
+        return self._request({"type": "start", "name": name, "email": email})["greeting"]
+
+    def send(self, text, on_chunk=None):
+        """
+        reply lines for one message; with on_chunk, a Gemini answer is also
+        passed to it piece by piece while it is being generated
+        """
+        if on_chunk is None:
+            return self._request({"type": "message", "text": text})["replies"]
+        response = self._request({"type": "message", "text": text, "stream": True})
+        while "chunk" in response:
+            on_chunk(response["chunk"])
+            response = self._response()
+        return response["replies"]
+
+    def upload(self, path):
+        return self._request({"type": "document", "path": path})["document"]
+
+    def close(self):
+        try:
+            # flushes whatever a failed write left behind, which fails again on a dead connection
+            self.file.close()
+        except OSError:
+            pass
+        finally:
+            self.sock.close()
+
+
+def connect(host=HOST, port=PORT, wait=60):
+    """Connect to the chat server, starting it in the background if it is not running"""
+    try:
+        return ChatClient(host, port)
+    except OSError:
+        pass
+    here = os.path.dirname(os.path.abspath(__file__))
+    subprocess.Popen(
+        [sys.executable, os.path.join(here, "chat_server.py"), host, str(port)],
+        cwd=here,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        start_new_session=True,
+    )
+    deadline = time.monotonic() + wait
+    while True:
+        try:
+            return ChatClient(host, port)
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.1)
+
+
+if __name__ == "__main__":
+    host = sys.argv[1] if len(sys.argv) > 1 else HOST
+    port = int(sys.argv[2]) if len(sys.argv) > 2 else PORT
+    asyncio.run(serve(host, port))
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+CACHE_DIR = "document_cache"
+SUPPORTED = {".pdf": "pdf", ".md": "markdown", ".markdown": "markdown", ".txt": "text"}
+
+
+def file_hash(path, block_size=1024 * 1024):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+def inspect_document(path):
+    """
+    cheap checks before ingesting: type from the extension, and for PDFs
+    the %PDF- signature, without opening the whole file
+    """
+    kind = SUPPORTED.get(os.path.splitext(path)[1].lower())
+    info = {"type": kind, "exists": os.path.isfile(path), "valid": False}
+    if not info["exists"] or kind is None:
+        return info
+    info["size"] = os.path.getsize(path)
+    if kind == "pdf":
+        with open(path, "rb") as f:
+            info["valid"] = f.read(5) == b"%PDF-"
+    else:
+        info["valid"] = True
+    return info
+
+
+def _strip_markdown(text):
+    import markdown
+
+    html = markdown.markdown(text)
+    return re.sub(r"<[^>]+>", " ", html)
+
+
+def extract_pages(path, lines_per_page=50):
+    """
+    yield (page number, text) one page at a time
+    PDFs are read page by page with PyMuPDF, text and markdown files are
+    split into pages of lines_per_page lines
+    """
+    kind = SUPPORTED.get(os.path.splitext(path)[1].lower())
+    if kind == "pdf":
+        import fitz  # PyMuPDF
+
+        with fitz.open(path) as doc:
+            for number, page in enumerate(doc, start=1):
+                yield number, page.get_text()
+        return
+
+    with open(path, "r", encoding="utf-8", errors="replace") as f:
+        lines = []
+        number = 0
+        for line in f:
+            lines.append(line)
+            if len(lines) >= lines_per_page:
+                number += 1
+                text = "".join(lines)
+                yield number, _strip_markdown(text) if kind == "markdown" else text
+                lines = []
+        if lines:
+            text = "".join(lines)
+            yield number + 1, _strip_markdown(text) if kind == "markdown" else text
+
+
+def chunk_pages(pages, chunk_words=150, overlap=30):
+    """
+    split streamed pages into overlapping chunks of about chunk_words words
+    each chunk remembers the page it starts on
+    """
+    step = max(chunk_words - overlap, 1)
+    for number, text in pages:
+        words = text.split()
+        for start in range(0, max(len(words) - overlap, 1), step):
+            piece = " ".join(words[start:start + chunk_words])
+            if piece:
+                yield {"page": number, "text": piece}
+
+
+def ingest_document(path, cache_dir=CACHE_DIR):
+    """
+    extract and chunk a document, reusing the cached chunks of a file with the same hash
+    runs in a worker process, so it only takes and returns plain data
+    """
+    digest = file_hash(path)
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = os.path.join(cache_dir, f"{digest}.jsonl")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            chunks = [json.loads(line) for line in f]
+        cached = True
+    else:
+        chunks = []
+        tmp = cache_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for chunk in chunk_pages(extract_pages(path)):
+                chunks.append(chunk)
+                f.write(json.dumps(chunk) + "\n")
+        os.replace(tmp, cache_path)
+        cached = False
+    pages = max((chunk["page"] for chunk in chunks), default=0)
+    return {"hash": digest, "path": path, "name": os.path.basename(path),
+            "pages": pages, "chunks": chunks, "cached": cached}
+
+
+class DocumentStore:
+    """
+    chunks of the documents one chat session ingested, one entry per file hash
+    """
+    def __init__(self):
+        self.documents = {}
+        self.chunks = []
+
+    def add(self, document):
+        if document["hash"] in self.documents:
+            return False
+        self.documents[document["hash"]] = {k: v for k, v in document.items() if k != "chunks"}
+        for chunk in document["chunks"]:
+            self.chunks.append({"document": document["name"], **chunk})
+        return True
+
+
+class DocumentIngestor:
+    """
+    runs ingest_document in a process pool so big PDFs never block the caller
+    submit() returns a concurrent.futures.Future with the ingested document
+    """
+    def __init__(self, max_workers=2, cache_dir=CACHE_DIR):
+        self.max_workers = max_workers
+        self.cache_dir = cache_dir
+        self._pool = None
+
+    def submit(self, path):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._pool.submit(ingest_document, path, self.cache_dir)
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown()
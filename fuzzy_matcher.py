@@ -0,0 +1,94 @@
+import math
+import re
+from collections import Counter, defaultdict
+import numpy as np
+
+
+def normalize(text):
+    return re.sub(r"\s+", " ", text.lower()).strip()
+
+
+def char_ngrams(text, n=3):
+    """
+    character n-grams of the padded text
+    example: char_ngrams("loan") -> {" lo": 1, "loa": 1, "oan": 1, "an ": 1}
+    """
+    text = f" {normalize(text)} "
+    return Counter(text[i:i + n] for i in range(max(len(text) - n + 1, 1)))
+
+
+class FuzzyIndex:
+    """
+    character n-gram TF-IDF index over intent patterns
+    the postings of all n-grams sit in two flat NumPy arrays (pattern ids and
+    weights), a query gathers the slices of its own n-grams and sums them per
+    pattern with one bincount, so no Python loop runs over the patterns
+    scores are cosine similarities between 0 and 1
+    """
+    def __init__(self, n=3):
+        self.n = n
+        self.patterns = []
+        self.keys = []
+        # n-gram -> (start, end) slice of doc_ids / weights
+        self.postings = {}
+        self.doc_ids = np.zeros(0, dtype=np.int32)
+        self.weights = np.zeros(0, dtype=np.float32)
+        self.key_ids = np.zeros(0, dtype=np.int32)
+        self.key_names = []
+        self.idf = {}
+        self.default_idf = 1.0
+
+    def add(self, pattern, key):
+        self.patterns.append(pattern)
+        self.keys.append(key)
+
+    def build(self):
+        grams = [char_ngrams(p, self.n) for p in self.patterns]
+        df = Counter(g for doc in grams for g in doc)
+        n_docs = len(grams)
+        self.idf = {g: math.log((1 + n_docs) / (1 + count)) + 1 for g, count in df.items()}
+        # n-grams never seen in a pattern still count against the query norm
+        self.default_idf = math.log(1 + n_docs) + 1
+
+        postings = defaultdict(list)
+        for doc_id, doc in enumerate(grams):
+            weights = {g: tf * self.idf[g] for g, tf in doc.items()}
+            norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+            for g, w in weights.items():
+                postings[g].append((doc_id, w / norm))
+        self.postings = {}
+        doc_ids, doc_weights = [], []
+        for g, entries in postings.items():
+            self.postings[g] = (len(doc_ids), len(doc_ids) + len(entries))
+            for doc_id, w in entries:
+                doc_ids.append(doc_id)
+                doc_weights.append(w)
+        self.doc_ids = np.array(doc_ids, dtype=np.int32)
+        self.weights = np.array(doc_weights, dtype=np.float32)
+        # one entry per key, so a key is reported once with its best pattern
+        key_index = {}
+        self.key_ids = np.array([key_index.setdefault(key, len(key_index)) for key in self.keys], dtype=np.int32)
+        self.key_names = list(key_index)
+        return self
+
+    def search(self, text, k=5):
+        """
+        return the top-k (key, score) pairs, best first, one entry per key
+        """
+        query = char_ngrams(text, self.n)
+        weights = {g: tf * self.idf.get(g, self.default_idf) for g, tf in query.items()}
+        norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+
+        slices = [(self.postings[g], w / norm) for g, w in weights.items() if g in self.postings]
+        if not slices:
+            return []
+        ids = np.concatenate([self.doc_ids[start:end] for (start, end), w in slices])
+        contributions = np.concatenate([self.weights[start:end] * w for (start, end), w in slices])
+        scores = np.bincount(ids, contributions, minlength=len(self.keys))
+
+        # best pattern score per key, then the top k keys
+        best = np.zeros(len(self.key_names))
+        np.maximum.at(best, self.key_ids, scores)
+        top = np.flatnonzero(best)
+        top = top[np.argsort(-best[top], kind="stable")[:k]]
+        return [(self.key_names[i], float(best[i])) for i in top]
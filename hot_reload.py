@@ -0,0 +1,97 @@
+import os
+import threading
+import time
+from inference import EXPORT_FILE, export_torchscript
+
+INTENTS_FILE = "intents.json"
+MODEL_FILE = "data.pth"
+
+
+def _mtimes(paths):
+    return {path: os.path.getmtime(path) if os.path.exists(path) else None for path in paths}
+
+
+class FileWatcher:
+    """
+    polls the mtimes of a few files in a daemon thread and calls
+    on_change(changed paths) once they have stopped changing for `debounce`
+    seconds, so a file still being written is not picked up half way
+    """
+    def __init__(self, paths, on_change, interval=2.0, debounce=1.0):
+        self.paths = list(paths)
+        self.on_change = on_change
+        self.interval = interval
+        self.debounce = debounce
+        self._seen = _mtimes(self.paths)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="file-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def poll(self):
+        """
+        one check, returns the changed paths it reported (empty if none)
+        """
+        current = _mtimes(self.paths)
+        changed = [path for path in self.paths if current[path] != self._seen[path]]
+        if not changed:
+            return []
+        # wait until the writer is done before reloading
+        while not self._stop.wait(self.debounce):
+            settled = _mtimes(self.paths)
+            if settled == current:
+                break
+            current = settled
+        try:
+            self.on_change(changed)
+        except Exception as e:
+            print(f"reload failed: {e}", flush=True)
+        # the callback may rewrite the watched files (retraining saves data.pth)
+        self._seen = _mtimes(self.paths)
+        return changed
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def retrain_and_reload(changed, intents_path=INTENTS_FILE, model_path=MODEL_FILE):
+    """
+    intents.json newer than data.pth: incremental retrain first (train.retrain
+    saves data.pth), then swap the bot state; a new data.pth alone is just reloaded
+    an existing TorchScript export is regenerated before the swap
+    """
+    import chat
+
+    if os.path.getmtime(intents_path) > os.path.getmtime(model_path):
+        from train import retrain
+
+        start = time.perf_counter()
+        stats = retrain(intents_path, model_path)
+        print(f"retrained in {time.perf_counter() - start:.1f}s, loss {stats['loss']:.4f}", flush=True)
+    if os.path.exists(EXPORT_FILE):
+        # keep the int8 TorchScript export in step with the new weights
+        from artifact import load_artifact
+
+        export_torchscript(load_artifact(chat.KEYWORD_GROUPS, intents_path=intents_path, model_path=model_path))
+    state = chat.reload_state()
+    print(f"reloaded {len(state.tags)} tags, {len(state.all_words)} words", flush=True)
+
+
+def watch(intents_path=INTENTS_FILE, model_path=MODEL_FILE, interval=2.0):
+    """
+    start watching intents.json and data.pth, returns the running FileWatcher
+    """
+    return FileWatcher(
+        [intents_path, model_path],
+        lambda changed: retrain_and_reload(changed, intents_path, model_path),
+        interval=interval,
+    ).start()
@@ -0,0 +1,127 @@
+import json
+import os
+import numpy as np
+
+EXPORT_FILE = "model_int8.pt"
+# stored inside the export: which weights (path and sha256) it was made from
+EXPORT_SOURCE = "source.json"
+
+
+def softmax(logits):
+    shifted = logits - logits.max(axis=1, keepdims=True)
+    exp = np.exp(shifted)
+    return exp / exp.sum(axis=1, keepdims=True)
+
+
+class NumpyBackend:
+    """
+    NeuralNet forward pass in plain NumPy, no torch import
+    weights are the float32 arrays of the artifact (mmapped, not copied)
+    """
+    name = "numpy"
+
+    def __init__(self, weights):
+        # transposed once so the forward pass is three x @ W + b
+        self.layers = [(np.ascontiguousarray(weights[f"{l}.weight"].T), weights[f"{l}.bias"]) for l in ("l1", "l2", "l3")]
+
+    def __call__(self, X):
+        out = np.asarray(X, dtype=np.float32)
+        for i, (W, b) in enumerate(self.layers):
+            out = out @ W + b
+            if i < len(self.layers) - 1:
+                out = np.maximum(out, 0, out=out)
+        # no activation and no softmax at the end, like NeuralNet
+        return out
+
+
+class TorchBackend:
+    """
+    an eager NeuralNet or a loaded TorchScript module behind the same
+    numpy-in, numpy-out interface as NumpyBackend
+    """
+    def __init__(self, model, device=None, name="torch"):
+        self.model = model
+        self.device = device
+        self.name = name
+
+    def __call__(self, X):
+        import torch
+
+        X = torch.from_numpy(np.asarray(X, dtype=np.float32))
+        if self.device is not None:
+            X = X.to(self.device)
+        with torch.inference_mode():
+            return self.model(X).float().cpu().numpy()
+
+
+def export_torchscript(artifact, out=EXPORT_FILE, quantize=True):
+    """
+    TorchScript export of the artifact model, with dynamic int8 quantization
+    of the Linear layers unless quantize is False; the hash of the weights
+    it was made from goes into the export
+    """
+    import torch
+
+    model = artifact.build_model()
+    if quantize:
+        model = torch.ao.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    scripted = torch.jit.script(model)
+    tmp = out + ".tmp"
+    source = {"model_path": artifact.model_path, "sha256": artifact.sources[artifact.model_path]["sha256"]}
+    scripted.save(tmp, _extra_files={EXPORT_SOURCE: json.dumps(source)})
+    os.replace(tmp, out)
+    return out
+
+
+def _torchscript_backend(artifact, path=EXPORT_FILE):
+    if not os.path.exists(path):
+        return None
+    import torch
+
+    extra = {EXPORT_SOURCE: ""}
+    model = torch.jit.load(path, map_location="cpu", _extra_files=extra)
+    # an export made from other weights than the artifact's (or before it recorded them) is ignored
+    try:
+        source = json.loads(extra[EXPORT_SOURCE])
+    except ValueError:
+        return None
+    if source.get("sha256") != artifact.sources[artifact.model_path]["sha256"]:
+        return None
+    model.eval()
+    return TorchBackend(model, name="torchscript")
+
+
+def _torch_backend(artifact):
+    import torch
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+    return TorchBackend(artifact.build_model(device), device)
+
+
+BACKENDS = {
+    "numpy": lambda artifact: NumpyBackend(artifact.weights),
+    "torchscript": _torchscript_backend,
+    "torch": _torch_backend,
+}
+
+
+def load_backend(artifact, prefer=("numpy", "torchscript", "torch")):
+    """
+    first backend in `prefer` that can be loaded here: torch not installed
+    or no fresh export just moves on to the next one
+    """
+    for name in prefer:
+        try:
+            backend = BACKENDS[name](artifact)
+        except ImportError:
+            continue
+        if backend is not None:
+            return backend
+    raise RuntimeError(f"no model backend available out of {list(prefer)}")
+
+
+if __name__ == "__main__":
+    from artifact import load_artifact
+    from chat import KEYWORD_GROUPS
+
+    print(f"quantized TorchScript model saved to {export_torchscript(load_artifact(KEYWORD_GROUPS))}")
@@ -0,0 +1,51 @@
+import numpy as np
+from inference import softmax
+from nltk_utils import BagOfWords, tokenize
+
+
+class IntentEngine:
+    """
+    classify messages into intent tags with the trained NeuralNet
+    a prediction only counts when its softmax probability reaches the threshold,
+    otherwise the tag is None and the caller should fall back to Gemini
+    the model is an inference backend (see inference.py): a callable from a
+    (N, V) float32 bag-of-words matrix to (N, tags) logits
+    with model_loader instead of a model, the backend is only loaded on the
+    first classification
+    """
+    def __init__(self, model, all_words, tags, threshold=0.75, model_loader=None):
+        self._model = model
+        self.model_loader = model_loader
+        self.all_words = all_words
+        self.featurizer = BagOfWords(all_words)
+        self.tags = tags
+        self.threshold = threshold
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = self.model_loader()
+        return self._model
+
+    def featurize(self, sentences):
+        return self.featurizer.transform_batch([tokenize(s) for s in sentences])
+
+    def classify_batch(self, sentences):
+        """
+        classify a list of messages as one batched tensor
+        returns a list of (tag or None, probability) in the same order
+        """
+        if not sentences:
+            return []
+        probs = softmax(self.model(self.featurize(sentences)))
+        best_idx = probs.argmax(axis=1)
+        best_probs = probs[np.arange(len(probs)), best_idx]
+
+        results = []
+        for prob, idx in zip(best_probs.tolist(), best_idx.tolist()):
+            tag = self.tags[idx] if prob >= self.threshold else None
+            results.append((tag, prob))
+        return results
+
+    def classify(self, sentence):
+        return self.classify_batch([sentence])[0]
@@ -0,0 +1,140 @@
+import math
+import re
+from collections import Counter
+
+# small seed texts per language, NSFAS questions as students actually ask them
+SAMPLES = {
+    "english": (
+        "What is NSFAS? Who can apply for NSFAS? When was NSFAS established? "
+        "I want to know if my application has been approved. How do I check my funding status? "
+        "What documents do I need to apply? Why is my application taking so long to process? "
+        "I want to speak to an official. What happens if I fail my modules? "
+        "How do I appeal a funding rejection? When will my allowance be paid? "
+        "Can I get a bursary or a loan for university or college? Please help me with my account."
+    ),
+    "setswana": (
+        "Ke eng NSFAS? Ke mang yo o tshwanetseng go ikwadisetsa basari ya NSFAS? "
+        "Ke mang yo o tshwanetseng go bona basari ya NSFAS? Ke moithuti yo o feng yo o tshwanetseng go ikwadisa? "
+        "Ke batla go itse gore kopo ya me e amogetswe. Ke kopa thuso ka madi a sekolo. "
+        "Go diragala eng fa ke palelwa ke dithuto tsa me? Ke tla amogela madi leng? "
+        "Ke batla go bua le motlhankedi. Ke dikwalo dife tse ke di tlhokang?"
+    ),
+    "sesotho": (
+        "NSFAS ke eng? Ke mang ya lokelang ho etsa kopo ya NSFAS? "
+        "Ke batla ho tseba hore na kopo ya ka e amohetswe. Ke kopa thuso ka tjhelete ya sekolo. "
+        "Ho etsahala eng ha ke hloleha dithuto tsa ka? Ke tla fumana tjhelete neng? "
+        "Ke batla ho bua le mosebeletsi. Ke ditokomane dife tseo ke di hlokang? "
+        "Hobaneng kopo ya ka e nka nako e telele hakana?"
+    ),
+    "isizulu": (
+        "Yini i-NSFAS? Iyini iNSFAS? Ngubani ongafaka isicelo se-NSFAS? "
+        "Ngifuna ukwazi ukuthi isicelo sami samukelwe yini. Ngicela usizo ngemali yesikole. "
+        "Kwenzekani uma ngehluleka izifundo zami? Ngizoyithola nini imali yami? "
+        "Ngifuna ukukhuluma nomsebenzi. Yimaphi amadokhumenti engiwadingayo? "
+        "Kungani isicelo sami sithatha isikhathi eside kangaka?"
+    ),
+    "isixhosa": (
+        "Yintoni i-NSFAS? Ngubani onokufaka isicelo se-NSFAS? "
+        "Ndifuna ukwazi ukuba isicelo sam samkelwe na. Ndicela uncedo ngemali yesikolo. "
+        "Kwenzeka ntoni xa ndisilela kwizifundo zam? Ndiza kuyifumana nini imali yam? "
+        "Ndifuna ukuthetha negosa. Ngawaphi amaxwebhu endiwadingayo? "
+        "Kutheni isicelo sam sithatha ixesha elide kangaka?"
+    ),
+    "afrikaans": (
+        "Wat is NSFAS? Wie kan vir NSFAS aansoek doen? "
+        "Ek wil weet of my aansoek goedgekeur is. Ek het hulp nodig met my studiegeld. "
+        "Wat gebeur as ek my modules druip? Wanneer sal my toelae betaal word? "
+        "Ek wil met 'n amptenaar praat. Watter dokumente het ek nodig? "
+        "Hoekom neem my aansoek so lank om verwerk te word?"
+    ),
+}
+
+
+def profile(text, n=3):
+    """
+    character n-gram counts of every word, padded with spaces
+    words shared by all languages (like "nsfas") still count but carry no signal
+    """
+    grams = Counter()
+    for word in re.findall(r"[^\W\d_]+", text.lower()):
+        word = f" {word} "
+        for size in range(1, n + 1):
+            for i in range(len(word) - size + 1):
+                grams[word[i:i + size]] += 1
+    return grams
+
+
+def _norm(grams):
+    return math.sqrt(sum(c * c for c in grams.values())) or 1.0
+
+
+class LanguageIdentifier:
+    """
+    local language identification by cosine similarity of n-gram profiles
+    "english" is held to a stricter margin and a minimum score, since that answer
+    skips translation: a short Afrikaans question scoring a little above
+    English ("Wat is NSFAS?") would otherwise never be translated
+    example:
+    identifier = LanguageIdentifier()
+    identifier.detect("Ek wil weet hoe om vir NSFAS aansoek te doen") -> "afrikaans"
+    identifier.detect("KE ENG NSFAS?") -> None (setswana and sesotho too close to call)
+    """
+    def __init__(self, samples=SAMPLES, min_margin=0.02, english_margin=0.05, english_min_score=0.75):
+        self.min_margin = min_margin
+        self.english_margin = english_margin
+        self.english_min_score = english_min_score
+        self.profiles = {}
+        for language, text in samples.items():
+            grams = profile(text)
+            self.profiles[language] = (grams, _norm(grams))
+
+    def scores(self, text):
+        """
+        (language, similarity) pairs, best first
+        """
+        query = profile(text)
+        q_norm = _norm(query)
+        scores = []
+        for language, (grams, norm) in self.profiles.items():
+            dot = sum(c * grams.get(g, 0) for g, c in query.items())
+            scores.append((language, dot / (q_norm * norm)))
+        return sorted(scores, key=lambda item: item[1], reverse=True)
+
+    def detect(self, text):
+        """
+        best language, or None when the top two are too close to call
+        """
+        scores = self.scores(text)
+        if not scores or scores[0][1] == 0:
+            return None
+        language, score = scores[0]
+        margin = score - scores[1][1] if len(scores) > 1 else score
+        if language == "english":
+            if margin < self.english_margin or score < self.english_min_score:
+                return None
+        elif margin < self.min_margin:
+            return None
+        return language
+
+
+DETECT_AND_TRANSLATE_PROMPT = (
+    "Identify the language of this text and translate it to English, keeping any NSFAS terms unchanged. "
+    "Reply in exactly two lines:\nLanguage: <name of the language>\nEnglish: <the translation>"
+)
+
+
+def parse_language_translation(reply):
+    """
+    split a reply to DETECT_AND_TRANSLATE_PROMPT into (language, english text)
+    """
+    language = None
+    english = None
+    for line in reply.splitlines():
+        key, _, value = line.partition(":")
+        if key.strip().lower() == "language" and language is None:
+            language = value.strip().lower()
+        elif key.strip().lower() == "english" and english is None:
+            english = value.strip()
+    if english is None:
+        english = reply.strip()
+    return language or "unknown", english
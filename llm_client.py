@@ -0,0 +1,276 @@
+import asyncio
+import queue
+import random
+import threading
+
+
+class GeminiBackend:
+    """
+    backend that sends prompts to a google.generativeai GenerativeModel
+    pass model_factory instead of model to defer importing and configuring
+    google.generativeai until the first call
+    """
+    def __init__(self, model=None, model_factory=None):
+        self._model = model
+        self.model_factory = model_factory
+        self._lock = threading.Lock()
+
+    @property
+    def model(self):
+        with self._lock:
+            if self._model is None:
+                self._model = self.model_factory()
+        return self._model
+
+    async def generate(self, parts):
+        response = await self.model.generate_content_async(parts)
+        return response.text.strip()
+
+    async def stream(self, parts):
+        response = await self.model.generate_content_async(parts, stream=True)
+        async for chunk in response:
+            if chunk.text:
+                yield chunk.text
+
+
+class FakeBackend:
+    """
+    deterministic stand-in for Gemini in tests and benchmarks
+    reply can be a fixed string or a function of the prompt parts
+    stream() waits latency before the first chunk, then yields the reply
+    one word at a time, chunk_delay apart
+    """
+    def __init__(self, reply="This is a fake NSFAS answer. It was generated locally.", latency=0.0, chunk_delay=0.0):
+        self.reply = reply
+        self.latency = latency
+        self.chunk_delay = chunk_delay
+        self.calls = 0
+
+    def _reply(self, parts):
+        if callable(self.reply):
+            return self.reply(parts)
+        return self.reply
+
+    async def generate(self, parts):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._reply(parts)
+
+    async def stream(self, parts):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        words = self._reply(parts).split(" ")
+        for i, word in enumerate(words):
+            if i and self.chunk_delay:
+                await asyncio.sleep(self.chunk_delay)
+            yield word if i == len(words) - 1 else word + " "
+
+
+class _StreamBuffer:
+    """
+    chunks of one upstream stream, kept so that every caller streaming the
+    same prompt gets them all: first the ones already in, then the live ones
+    """
+    def __init__(self):
+        self.chunks = []
+        self.done = False
+        self.error = None
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def put(self, chunk):
+        self.chunks.append(chunk)
+        self._notify()
+
+    def close(self, error=None):
+        self.done = True
+        self.error = error
+        self._notify()
+
+    async def follow(self):
+        i = 0
+        while True:
+            if i < len(self.chunks):
+                yield self.chunks[i]
+                i += 1
+            elif self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            else:
+                await self._changed.wait()
+
+
+def prompt_key(parts):
+    """
+    prompts that only differ in case or whitespace share a key
+    """
+    return "\n".join(" ".join(str(part).split()).casefold() for part in parts)
+
+
+class LLMClient:
+    """
+    asyncio client in front of an LLM backend
+    - a semaphore bounds the number of calls in flight
+    - every attempt has its own deadline (timeout seconds)
+    - failed attempts are retried with jittered exponential backoff
+    - single flight: while a prompt is in flight, callers with the same
+      prompt_key wait for that call instead of sending their own
+    - stream() yields the answer in chunks as the backend produces them,
+      a stream joining one in flight replays its chunks, then follows it
+    synchronous callers use generate_sync / stream_sync, which run the call
+    on a shared event loop thread so the limits hold across threads
+    """
+    def __init__(self, backend, max_concurrency=8, timeout=15.0, retries=2, backoff=0.5):
+        self.backend = backend
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff = backoff
+        self.requests = 0
+        self.coalesced = 0
+        self._loop = None
+        self._semaphores = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                threading.Thread(target=self._loop.run_forever, daemon=True).start()
+        return self._loop
+
+    async def generate(self, parts, timeout=None):
+        # asyncio primitives belong to one loop, so in-flight calls are per loop too
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        key = prompt_key(parts)
+        self.requests += 1
+        task = inflight.get(key)
+        if task is None:
+            task = inflight[key] = loop.create_task(self._generate(parts, timeout))
+            task.add_done_callback(lambda _: inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+        if isinstance(task, _StreamBuffer):
+            # the same prompt is being streamed, wait for the whole answer
+            return "".join([chunk async for chunk in task.follow()]).strip()
+        # shielded: a caller that gives up does not cancel the call for the others
+        return await asyncio.shield(task)
+
+    def _semaphore(self):
+        loop = asyncio.get_running_loop()
+        semaphore = self._semaphores.get(loop)
+        if semaphore is None:
+            semaphore = self._semaphores[loop] = asyncio.Semaphore(self.max_concurrency)
+        return semaphore
+
+    async def _generate(self, parts, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        async with self._semaphore():
+            for attempt in range(self.retries + 1):
+                try:
+                    return await asyncio.wait_for(self.backend.generate(parts), timeout)
+                except Exception:
+                    if attempt == self.retries:
+                        raise
+                    delay = self.backoff * (2 ** attempt)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    async def stream(self, parts, timeout=None):
+        """
+        yield text chunks of the answer as they arrive
+        timeout applies to every chunk; a failure before the first chunk is
+        retried like generate(), after it the error is raised
+        single flight like generate(): the upstream stream runs in its own task
+        and fills a buffer, every caller with the same prompt follows that buffer;
+        an identical generate() in flight is joined and yields its whole answer
+        """
+        loop = asyncio.get_running_loop()
+        inflight = self._inflight.setdefault(loop, {})
+        key = prompt_key(parts)
+        self.requests += 1
+        task = inflight.get(key)
+        if task is None:
+            buffer = inflight[key] = _StreamBuffer()
+            # a caller that stops reading does not stop the stream for the others
+            buffer.task = loop.create_task(self._pump(parts, timeout, buffer))
+            buffer.task.add_done_callback(lambda _: inflight.pop(key, None))
+        else:
+            self.coalesced += 1
+            if not isinstance(task, _StreamBuffer):
+                yield await asyncio.shield(task)
+                return
+            buffer = task
+        async for chunk in buffer.follow():
+            yield chunk
+
+    async def _pump(self, parts, timeout, buffer):
+        try:
+            async for chunk in self._stream(parts, timeout):
+                buffer.put(chunk)
+            buffer.close()
+        except Exception as e:
+            buffer.close(e)
+
+    async def _stream(self, parts, timeout):
+        timeout = self.timeout if timeout is None else timeout
+        async with self._semaphore():
+            for attempt in range(self.retries + 1):
+                started = False
+                try:
+                    chunks = self.backend.stream(parts).__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(chunks.__anext__(), timeout)
+                        except StopAsyncIteration:
+                            return
+                        started = True
+                        yield chunk
+                except Exception:
+                    if started or attempt == self.retries:
+                        raise
+                    delay = self.backoff * (2 ** attempt)
+                    await asyncio.sleep(delay * random.uniform(0.5, 1.5))
+
+    def stream_sync(self, parts, timeout=None):
+        """
+        stream() for synchronous callers, a generator of chunks
+        """
+        chunks = queue.Queue()
+
+        async def pump():
+            try:
+                async for chunk in self.stream(parts, timeout):
+                    chunks.put((True, chunk))
+                chunks.put((False, None))
+            except Exception as e:
+                chunks.put((False, e))
+
+        asyncio.run_coroutine_threadsafe(pump(), self._ensure_loop())
+        while True:
+            more, item = chunks.get()
+            if not more:
+                if item is not None:
+                    raise item
+                return
+            yield item
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "upstream": self.requests - self.coalesced,
+            "coalesced": self.coalesced,
+            "coalesced_rate": self.coalesced / self.requests if self.requests else 0.0,
+        }
+
+    def generate_sync(self, parts, timeout=None):
+        future = asyncio.run_coroutine_threadsafe(self.generate(parts, timeout), self._ensure_loop())
+        return future.result()
@@ -1,15 +1,35 @@
+from functools import lru_cache
 import numpy as np
-import nltk
+# nltk is imported on first use, importing it takes most of a second
 # nltk.download('punkt')
-from nltk.stem.porter import PorterStemmer
-stemmer = PorterStemmer()
+stemmer = None
+
+# bounds for the LRU caches, traffic is mostly a few thousand repeated phrasings
+TOKENIZE_CACHE_SIZE = 4096
+STEM_CACHE_SIZE = 16384
+
+
+@lru_cache(maxsize=TOKENIZE_CACHE_SIZE)
+def _tokenize(sentence):
+    import nltk
+    return tuple(nltk.word_tokenize(sentence))
+
+
+@lru_cache(maxsize=STEM_CACHE_SIZE)
+def _stem(word):
+    global stemmer
+    if stemmer is None:
+        from nltk.stem.porter import PorterStemmer
+        stemmer = PorterStemmer()
+    return stemmer.stem(word.lower())
+
 
 def tokenize(sentence):
     """
     split sentence into array of words/tokens
     a token can be a word or punctuation character, or number
     """
-    return nltk.word_tokenize(sentence)
+    return list(_tokenize(sentence))
 
 
 def stem(word):
@@ -20,7 +40,34 @@ def stem(word):
     words = [stem(w) for w in words]
     -> ["organ", "organ", "organ"]
     """
-    return stemmer.stem(word.lower())
+    return _stem(word)
+
+
+def cache_stats():
+    """
+    hit/miss counters of the tokenize and stem caches
+    """
+    stats = {}
+    for name, cached in (("tokenize", _tokenize), ("stem", _stem)):
+        info = cached.cache_info()
+        stats[name] = {"hits": info.hits, "misses": info.misses, "size": info.currsize, "maxsize": info.maxsize}
+    return stats
+
+
+def clear_caches():
+    _tokenize.cache_clear()
+    _stem.cache_clear()
+
+
+def warm_cache(intents):
+    """
+    pre-tokenize and pre-stem every pattern in intents.json
+    so the first students asking the usual questions hit the cache
+    """
+    for intent in intents['intents']:
+        for pattern in intent['patterns']:
+            for word in tokenize(pattern):
+                stem(word)
 
 
 def bag_of_words(tokenized_sentence, words):
@@ -33,11 +80,59 @@ def bag_of_words(tokenized_sentence, words):
     bog   = [  0 ,    1 ,    0 ,   1 ,    0 ,    0 ,      0]
     """
     # stem each word
-    sentence_words = [stem(word) for word in tokenized_sentence]
+    sentence_words = {stem(word) for word in tokenized_sentence}
     # initialize bag with 0 for each word
     bag = np.zeros(len(words), dtype=np.float32)
     for idx, w in enumerate(words):
-        if w in sentence_words: 
+        if w in sentence_words:
             bag[idx] = 1
 
-    return bag
\ No newline at end of file
+    return bag
+
+
+class BagOfWords:
+    """
+    bag of words featurizer built once from all_words
+    keeps a word -> column dict so a sentence costs O(S) instead of O(V*S)
+    example:
+    featurizer = BagOfWords(all_words)
+    featurizer.transform(["hello", "you"])        -> (V,) array
+    featurizer.transform_batch([s1, s2, s3])      -> (3, V) matrix
+    """
+    def __init__(self, words):
+        self.words = list(words)
+        self.index = {w: idx for idx, w in enumerate(self.words)}
+
+    def __len__(self):
+        return len(self.words)
+
+    def columns(self, tokenized_sentence):
+        # stem each word and keep the columns of the known ones
+        cols = {self.index.get(stem(word)) for word in tokenized_sentence}
+        cols.discard(None)
+        return np.fromiter(cols, dtype=np.intp, count=len(cols))
+
+    def transform(self, tokenized_sentence):
+        bag = np.zeros(len(self.words), dtype=np.float32)
+        bag[self.columns(tokenized_sentence)] = 1
+        return bag
+
+    def transform_batch(self, tokenized_sentences, sparse=False):
+        """
+        turn N tokenized sentences into one (N, V) float32 matrix
+        sparse=True returns a scipy.sparse CSR matrix instead
+        """
+        cols = [self.columns(s) for s in tokenized_sentences]
+        lengths = np.array([len(c) for c in cols], dtype=np.intp)
+        rows = np.repeat(np.arange(len(cols)), lengths)
+        cols = np.concatenate(cols) if cols else np.zeros(0, dtype=np.intp)
+        shape = (len(tokenized_sentences), len(self.words))
+
+        if sparse:
+            from scipy.sparse import csr_matrix
+            indptr = np.concatenate(([0], np.cumsum(lengths)))
+            return csr_matrix((np.ones(len(cols), dtype=np.float32), cols, indptr), shape=shape)
+
+        X = np.zeros(shape, dtype=np.float32)
+        X[rows, cols] = 1
+        return X
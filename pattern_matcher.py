@@ -0,0 +1,106 @@
+from collections import deque, namedtuple
+
+Match = namedtuple("Match", ["start", "end", "pattern", "group", "value"])
+
+
+class PatternMatcher:
+    """
+    Aho-Corasick automaton over lowercased patterns
+    finds every pattern that occurs in a text in one pass over the text,
+    so the cost no longer grows with the number of intents
+    example:
+    matcher = PatternMatcher()
+    matcher.add_all(["loan", "bursary"], "nsfas")
+    matcher.build()
+    matcher.groups("Can I get a LOAN?") -> {"nsfas"}
+    """
+    def __init__(self):
+        self.goto = [{}]
+        self.fail = [0]
+        self.output = [[]]
+        self.entries = []
+        self.built = False
+
+    def add(self, pattern, group, value=None):
+        pattern = pattern.lower()
+        if not pattern:
+            return
+        node = 0
+        for ch in pattern:
+            nxt = self.goto[node].get(ch)
+            if nxt is None:
+                nxt = len(self.goto)
+                self.goto[node][ch] = nxt
+                self.goto.append({})
+                self.fail.append(0)
+                self.output.append([])
+            node = nxt
+        # entries keep insertion order, used to break ties deterministically
+        self.output[node].append(len(self.entries))
+        self.entries.append((pattern, group, value))
+        self.built = False
+
+    def add_all(self, patterns, group, value=None):
+        for pattern in patterns:
+            self.add(pattern, group, value)
+
+    def build(self):
+        """
+        compute failure links breadth first and merge outputs along them
+        """
+        queue = deque()
+        for nxt in self.goto[0].values():
+            self.fail[nxt] = 0
+            queue.append(nxt)
+        while queue:
+            node = queue.popleft()
+            for ch, nxt in self.goto[node].items():
+                queue.append(nxt)
+                f = self.fail[node]
+                while f and ch not in self.goto[f]:
+                    f = self.fail[f]
+                self.fail[nxt] = self.goto[f].get(ch, 0)
+                self.output[nxt] = self.output[nxt] + self.output[self.fail[nxt]]
+        self.built = True
+        return self
+
+    def _scan(self, text):
+        """
+        (entry index, Match) for every pattern in the text, ordered by end position
+        """
+        if not self.built:
+            self.build()
+        matches = []
+        node = 0
+        for i, ch in enumerate(text.lower()):
+            while node and ch not in self.goto[node]:
+                node = self.fail[node]
+            node = self.goto[node].get(ch, 0)
+            for idx in self.output[node]:
+                pattern, group, value = self.entries[idx]
+                matches.append((idx, Match(i + 1 - len(pattern), i + 1, pattern, group, value)))
+        return matches
+
+    def matches(self, text, group=None):
+        return [m for _, m in self._scan(text) if group is None or m.group == group]
+
+    def groups(self, text):
+        """
+        set of groups with at least one pattern in the text
+        """
+        return {m.group for _, m in self._scan(text)}
+
+    def longest(self, text, group=None):
+        """
+        best match of a group: longest pattern first,
+        then the earliest pattern added, then the earliest position
+        """
+        best = None
+        best_key = None
+        for idx, m in self._scan(text):
+            if group is not None and m.group != group:
+                continue
+            key = (-len(m.pattern), idx, m.start)
+            if best_key is None or key < best_key:
+                best, best_key = m, key
+        return best
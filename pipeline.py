@@ -0,0 +1,112 @@
+class Message:
+    """
+    one user message on its way through the pipeline
+    stages read text / english and fill in the rest; the stage that answers
+    calls answer(), which ends the run
+    """
+    def __init__(self, text, session=None, on_progress=None, on_chunk=None):
+        self.text = text
+        self.session = session
+        self.on_progress = on_progress
+        # called with each piece of a streamed Gemini answer as it arrives
+        self.on_chunk = on_chunk
+        self.language = None
+        self.english = text
+        # retrieved passages handed to the Gemini fallback
+        self.context = []
+        # the context includes the student's own documents, keep the answer out of shared caches
+        self.private_context = False
+        self.replies = None
+        self.response = None
+        self.source = None
+        self.cache = None
+        # why the message could not be answered, set by callers that catch stage errors (batch.py)
+        self.error = None
+        # what the stages answer with (chat.BotState), pinned by the first stage that
+        # reads it so a reload halfway through does not mix two models in one answer
+        self.state = None
+
+    def answer(self, replies, source, response=None, cache=None):
+        """
+        replies: the lines shown to the student
+        response: what the analytics log records (the first reply by default)
+        """
+        self.replies = list(replies)
+        self.source = source
+        self.response = response if response is not None else self.replies[0]
+        self.cache = cache
+
+    @property
+    def answered(self):
+        return self.replies is not None
+
+    def progress(self, text):
+        # interim notice for the caller, e.g. before a slow Gemini call
+        if self.on_progress is not None:
+            self.on_progress(text)
+
+
+class Pipeline:
+    """
+    ordered (name, stage) pairs, a stage is any callable taking a Message
+    stages run until one of them answers the message
+    replace(), without() and starting_at() return new pipelines, so a caller
+    can plug in its own stage without touching the shared one
+    """
+    def __init__(self, stages):
+        self.stages = list(stages)
+
+    @property
+    def names(self):
+        return [name for name, stage in self.stages]
+
+    def _index(self, name):
+        try:
+            return self.names.index(name)
+        except ValueError:
+            raise KeyError(f"no stage named {name!r}, stages are {self.names}") from None
+
+    def replace(self, name, stage):
+        stages = list(self.stages)
+        stages[self._index(name)] = (name, stage)
+        return Pipeline(stages)
+
+    def without(self, name):
+        i = self._index(name)
+        return Pipeline(self.stages[:i] + self.stages[i + 1:])
+
+    def starting_at(self, name):
+        return Pipeline(self.stages[self._index(name):])
+
+    def map(self, wrap):
+        """
+        new pipeline with every stage replaced by wrap(name, stage)
+        """
+        return Pipeline([(name, wrap(name, stage)) for name, stage in self.stages])
+
+    def run(self, message):
+        for name, stage in self.stages:
+            stage(message)
+            if message.answered:
+                break
+        return message
+
+    def run_batch(self, messages, map=map):
+        """
+        run many messages stage by stage, with the same answers as run() per message
+        a stage with a `batch` attribute gets all still unanswered messages in
+        one call (one model batch, one retrieval matmul), any other stage is
+        called per message through map, e.g. a thread pool's map for the
+        stages that wait on Gemini
+        a replaced stage has no batch variant unless it brings its own
+        """
+        for name, stage in self.stages:
+            pending = [message for message in messages if not message.answered]
+            if not pending:
+                break
+            batch = getattr(stage, "batch", None)
+            if batch is not None:
+                batch(pending)
+            else:
+                list(map(stage, pending))
+        return messages
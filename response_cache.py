@@ -0,0 +1,186 @@
+import math
+import sqlite3
+import threading
+import time
+from collections import Counter, defaultdict
+from nltk_utils import stem, tokenize
+
+
+def cache_key(text):
+    """
+    normalized, stemmed form of a question
+    "What is NSFAS?" and "what is nsfas" share one key
+    """
+    return " ".join(stem(w) for w in tokenize(text.lower()) if any(ch.isalnum() for ch in w))
+
+
+class ResponseCache:
+    """
+    persistent SQLite cache of generated answers keyed on cache_key(question)
+    - entries older than ttl seconds are ignored and purged
+    - once more than max_entries are stored, the least recently used go first
+    - with a featurizer (nltk_utils.BagOfWords), a miss on the exact key falls
+      back to the most similar cached question above near_threshold (cosine
+      of the two sets of stemmed words, words outside the vocabulary included)
+    """
+    def __init__(self, path="response_cache.db", ttl=7 * 24 * 3600, max_entries=5000,
+                 featurizer=None, near_threshold=0.95):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.featurizer = featurizer
+        self.near_threshold = near_threshold
+        self.hits = 0
+        self.near_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # the database is opened on first use, importing chat does not touch it
+        self._db = None
+        # near-duplicate index, built on the first lookup that needs it:
+        # the word columns of every cached key and, per column, the keys using it
+        self._columns = None
+        self._postings = None
+        self._extra = {}
+
+    @property
+    def _conn(self):
+        # only used with self._lock held
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS responses ("
+                " key TEXT PRIMARY KEY, response TEXT NOT NULL,"
+                " created REAL NOT NULL, last_used REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS responses_last_used ON responses (last_used)")
+            self._db.commit()
+        return self._db
+
+    def set_featurizer(self, featurizer):
+        """
+        switch to a new vocabulary (after a model reload), the near-duplicate
+        index is rebuilt on the next lookup
+        """
+        with self._lock:
+            self.featurizer = featurizer
+            self._columns = None
+
+    def _key_columns(self, key):
+        # keys are already stemmed, so words map straight to vocabulary columns;
+        # words outside the vocabulary get columns of their own, they still count
+        index = self.featurizer.index
+        columns = set()
+        for word in key.split():
+            column = index.get(word)
+            if column is None:
+                column = self._extra.setdefault(word, len(index) + len(self._extra))
+            columns.add(column)
+        return frozenset(columns)
+
+    def _load_index(self):
+        rows = self._conn.execute("SELECT key FROM responses WHERE created >= ?", (time.time() - self.ttl,))
+        self._columns = {}
+        self._postings = defaultdict(set)
+        self._extra = {}
+        for (key,) in rows:
+            self._index_key(key)
+
+    def _index_key(self, key):
+        self._unindex_key(key)
+        columns = self._columns[key] = self._key_columns(key)
+        for column in columns:
+            self._postings[column].add(key)
+
+    def _unindex_key(self, key):
+        for column in self._columns.pop(key, ()):
+            self._postings[column].discard(key)
+
+    def _nearest(self, key):
+        """
+        cached key with the highest cosine similarity of word sets, if it reaches near_threshold
+        """
+        if self._columns is None:
+            self._load_index()
+        query = self._key_columns(key)
+        if not query:
+            return None
+        shared = Counter()
+        for column in query:
+            shared.update(self._postings.get(column, ()))
+        best, best_score = None, 0.0
+        for other, count in shared.items():
+            score = count / math.sqrt(len(query) * len(self._columns[other]))
+            if score > best_score:
+                best, best_score = other, score
+        if best_score >= self.near_threshold:
+            return best
+        return None
+
+    def get(self, question):
+        """
+        return (response, kind) where kind is "hit", "near_hit" or "miss"
+        """
+        key = cache_key(question)
+        now = time.time()
+        with self._lock:
+            for kind, lookup in (("hit", key), ("near_hit", None)):
+                if lookup is None:
+                    lookup = self._nearest(key)
+                    if lookup is None:
+                        break
+                row = self._conn.execute(
+                    "SELECT response FROM responses WHERE key = ? AND created >= ?", (lookup, now - self.ttl)
+                ).fetchone()
+                if row:
+                    self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, lookup))
+                    self._conn.commit()
+                    if kind == "hit":
+                        self.hits += 1
+                    else:
+                        self.near_hits += 1
+                    return row[0], kind
+            self.misses += 1
+            return None, "miss"
+
+    def put(self, question, response):
+        key = cache_key(question)
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (key, response, created, last_used) VALUES (?, ?, ?, ?)",
+                (key, response, now, now),
+            )
+            evicted = self._evict(now)
+            self._conn.commit()
+            if self.featurizer is not None and self._columns is not None:
+                self._index_key(key)
+                for old in evicted:
+                    self._unindex_key(old)
+
+    def _evict(self, now):
+        """
+        delete expired rows, then the least recently used beyond max_entries
+        returns the deleted keys
+        """
+        expired = [key for (key,) in self._conn.execute(
+            "SELECT key FROM responses WHERE created < ?", (now - self.ttl,))]
+        self._conn.execute("DELETE FROM responses WHERE created < ?", (now - self.ttl,))
+        unused = [key for (key,) in self._conn.execute(
+            "SELECT key FROM responses ORDER BY last_used DESC LIMIT -1 OFFSET ?", (self.max_entries,))]
+        self._conn.executemany("DELETE FROM responses WHERE key = ?", [(key,) for key in unused])
+        return expired + unused
+
+    def stats(self):
+        lookups = self.hits + self.near_hits + self.misses
+        return {
+            "hits": self.hits,
+            "near_hits": self.near_hits,
+            "misses": self.misses,
+            "hit_rate": (self.hits + self.near_hits) / lookups if lookups else 0.0,
+        }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -0,0 +1,105 @@
+import math
+from collections import Counter
+import numpy as np
+from nltk_utils import stem, tokenize
+
+
+STOP_WORDS = {
+    "a", "an", "the", "and", "or", "of", "to", "in", "on", "for", "at", "by", "with", "about",
+    "is", "are", "was", "be", "do", "does", "did", "i", "me", "my", "you", "your", "it", "this",
+    "that", "what", "how", "who", "when", "why", "can", "will", "if", "tell", "please",
+}
+
+
+def terms(text):
+    return [stem(w) for w in tokenize(text.lower()) if any(ch.isalnum() for ch in w) and w not in STOP_WORDS]
+
+
+class RetrievalIndex:
+    """
+    TF-IDF vectors of passages (intent responses and document chunks) stacked
+    into one L2-normalized NumPy matrix; a query is answered with a single
+    matmul and the top-k cosine similarities
+    build() swaps in a new (vocab, idf, matrix) in one assignment and every
+    search reads that tuple once, so a rebuild in another thread is never seen half done
+    """
+    def __init__(self):
+        self.passages = []
+        self._terms = []
+        self.tables = ({}, np.zeros(0, dtype=np.float32), np.zeros((0, 0), dtype=np.float32))
+
+    def add(self, text, source):
+        self.passages.append({"text": text, "source": source})
+        self._terms.append(Counter(terms(text)))
+
+    def add_intents(self, intents):
+        for intent in intents['intents']:
+            for response in intent['responses']:
+                self.add(response, f"intent:{intent['tag']}")
+
+    def add_chunks(self, chunks):
+        for chunk in chunks:
+            self.add(chunk["text"], f"document:{chunk['document']} p.{chunk['page']}")
+
+    def build(self):
+        """
+        (re)compute vocabulary, idf and the passage matrix after adding passages
+        """
+        docs = list(self._terms)
+        df = Counter(t for doc in docs for t in doc)
+        vocab = {t: i for i, t in enumerate(sorted(df))}
+        idf = np.array([math.log((1 + len(docs)) / (1 + df[t])) + 1 for t in sorted(df)], dtype=np.float32)
+        matrix = np.zeros((len(docs), len(vocab)), dtype=np.float32)
+        for row, doc in enumerate(docs):
+            for t, tf in doc.items():
+                matrix[row, vocab[t]] = tf
+        matrix *= idf
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        matrix /= np.maximum(norms, 1e-12)
+        self.tables = (vocab, idf, matrix)
+        return self
+
+    def vectorize(self, text, tables=None):
+        vocab, idf, matrix = tables or self.tables
+        vec = np.zeros(len(vocab), dtype=np.float32)
+        unknown = 0.0
+        for t, tf in Counter(terms(text)).items():
+            col = vocab.get(t)
+            if col is not None:
+                vec[col] = tf * idf[col]
+            else:
+                # words no passage contains still weigh in the query norm
+                unknown += (tf * idf.max()) ** 2
+        norm = math.sqrt(float(vec @ vec) + unknown)
+        return vec / norm if norm else vec
+
+    def search(self, query, k=3):
+        """
+        top-k (passage, score) pairs, best first
+        """
+        tables = self.tables
+        vocab, idf, matrix = tables
+        if not len(matrix) or not vocab:
+            return []
+        scores = matrix @ self.vectorize(query, tables)
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.passages[i], float(scores[i])) for i in top if scores[i] > 0]
+
+    def search_batch(self, queries, k=3):
+        """
+        search() for many queries with one (passages x queries) matmul
+        """
+        tables = self.tables
+        vocab, idf, matrix = tables
+        if not len(matrix) or not vocab or not queries:
+            return [[] for _ in queries]
+        scores = matrix @ np.stack([self.vectorize(q, tables) for q in queries], axis=1)
+        k = min(k, len(scores))
+        results = []
+        for col in scores.T:
+            top = np.argpartition(-col, k - 1)[:k]
+            top = top[np.argsort(-col[top])]
+            results.append([(self.passages[i], float(col[i])) for i in top if col[i] > 0])
+        return results
@@ -0,0 +1,165 @@
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+
+class TicketStore:
+    """
+    escalation tickets in a WAL-mode SQLite database
+    - ticket numbers come from an AUTOINCREMENT id, so they never collide
+      and always increase: TKT-20250420-000042
+    - with commit_every > 1 creates are batched: create() returns as soon as
+      the row is inserted, the commit happens once commit_every tickets are
+      waiting or flush_interval seconds after the first of them, whichever is first
+    - email and created_at are indexed for the query APIs
+    """
+    def __init__(self, path="tickets.db", commit_every=1, flush_interval=1.0):
+        self.path = path
+        self.commit_every = commit_every
+        self.flush_interval = flush_interval
+        self._uncommitted = 0
+        self._timer = None
+        self._lock = threading.Lock()
+        # the database is created on first use, importing chat does not touch it
+        self._db = None
+
+    @property
+    def _conn(self):
+        # only used with self._lock held
+        if self._db is None:
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS tickets ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+                " ticket_number TEXT UNIQUE,"
+                " student_name TEXT, email TEXT, question TEXT,"
+                " status TEXT NOT NULL DEFAULT 'open',"
+                " created_at TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS tickets_email ON tickets (email, status, created_at)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS tickets_status ON tickets (status, created_at)")
+            self._db.commit()
+        return self._db
+
+    def create(self, student_name, email, question):
+        now = datetime.datetime.now()
+        with self._lock:
+            cur = self._conn.execute(
+                "INSERT INTO tickets (student_name, email, question, created_at) VALUES (?, ?, ?, ?)",
+                (student_name, email, question, now.isoformat()),
+            )
+            ticket_number = f"TKT-{now.strftime('%Y%m%d')}-{cur.lastrowid:06d}"
+            self._conn.execute("UPDATE tickets SET ticket_number = ? WHERE id = ?", (ticket_number, cur.lastrowid))
+            self._uncommitted += 1
+            if self._uncommitted >= self.commit_every:
+                self._commit()
+            elif self._timer is None:
+                # a lone ticket is still committed (and visible to other connections) soon
+                self._timer = threading.Timer(self.flush_interval, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        return {
+            "ticket_number": ticket_number,
+            "student_name": student_name,
+            "email": email,
+            "question": question,
+            "timestamp": now.isoformat(),
+        }
+
+    def _commit(self):
+        if self._db is not None:
+            self._db.commit()
+        self._uncommitted = 0
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def flush(self):
+        with self._lock:
+            self._commit()
+
+    def _query(self, sql, params):
+        with self._lock:
+            self._conn.row_factory = sqlite3.Row
+            rows = self._conn.execute(sql, params).fetchall()
+            self._conn.row_factory = None
+        return [dict(row) for row in rows]
+
+    def open_tickets(self, email=None, start=None, end=None):
+        """
+        open tickets, optionally for one email and/or created in [start, end)
+        start and end are datetimes or ISO strings
+        """
+        sql = "SELECT * FROM tickets WHERE status = 'open'"
+        params = []
+        if email is not None:
+            sql += " AND email = ?"
+            params.append(email)
+        if start is not None:
+            sql += " AND created_at >= ?"
+            params.append(start.isoformat() if hasattr(start, "isoformat") else start)
+        if end is not None:
+            sql += " AND created_at < ?"
+            params.append(end.isoformat() if hasattr(end, "isoformat") else end)
+        return self._query(sql + " ORDER BY id", params)
+
+    def get(self, ticket_number):
+        rows = self._query("SELECT * FROM tickets WHERE ticket_number = ?", (ticket_number,))
+        return rows[0] if rows else None
+
+    def close_ticket(self, ticket_number):
+        with self._lock:
+            self._conn.execute("UPDATE tickets SET status = 'closed' WHERE ticket_number = ?", (ticket_number,))
+            self._commit()
+
+    def import_json_lines(self, path="pending_tickets.json"):
+        """
+        migrate the old append-only pending_tickets.json once, keeping ticket numbers
+        a number already taken (two escalations in the same second) gets the row id appended
+        the file is first claimed by renaming it to <path>.importing, so of two
+        processes starting together only one imports it, and renamed to
+        <path>.imported once its tickets are committed; an import that fails
+        halfway commits nothing and leaves <path>.importing for a retry by hand
+        the chat server runs this at startup
+        """
+        claimed = path + ".importing"
+        try:
+            os.replace(path, claimed)
+        except FileNotFoundError:
+            return 0
+        count = 0
+        with self._lock, open(claimed, "r", encoding="utf-8") as f:
+            # tickets created before this are not part of the import transaction
+            self._commit()
+            try:
+                for line in f:
+                    if not line.strip():
+                        continue
+                    t = json.loads(line)
+                    cur = self._conn.execute(
+                        "INSERT INTO tickets (student_name, email, question, created_at) VALUES (?, ?, ?, ?)",
+                        (t.get("student_name"), t.get("email"), t.get("question"), t["timestamp"]),
+                    )
+                    number = t["ticket_number"]
+                    taken = self._conn.execute("SELECT 1 FROM tickets WHERE ticket_number = ?", (number,)).fetchone()
+                    if taken:
+                        number = f"{number}-{cur.lastrowid}"
+                    self._conn.execute("UPDATE tickets SET ticket_number = ? WHERE id = ?", (number, cur.lastrowid))
+                    count += 1
+            except Exception:
+                self._conn.rollback()
+                raise
+            self._commit()
+        os.replace(claimed, path + ".imported")
+        return count
+
+    def close(self):
+        with self._lock:
+            self._commit()
+            if self._db is not None:
+                self._db.close()
+                self._db = None
@@ -1,129 +1,225 @@
 import numpy as np
 import random
 import json
+import os
+import time
 import torch
 import torch.nn as nn
-from torch.utils.data import Dataset, DataLoader
-from nltk_utils import bag_of_words, tokenize, stem
+from nltk_utils import BagOfWords, tokenize, stem
 from model import NeuralNet
 
 
-with open('intents.json', 'r') as f:
-    intents = json.load(f)
-
-all_words = []
-tags = []
-xy = []
-# loop through each sentence in our intents patterns
-for intent in intents['intents']:
-    tag = intent['tag']
-    # add to tag list
-    tags.append(tag)
-    for pattern in intent['patterns']:
-        # tokenize each word in the sentence
-        w = tokenize(pattern)
-        # add to our words list
-        all_words.extend(w)
-        # add to xy pair
-        xy.append((w, tag))
-
-# stem and lower each word
-ignore_words = ['?', '.', '!']
-all_words = [stem(w) for w in all_words if w not in ignore_words]
-# remove duplicates and sort
-all_words = sorted(set(all_words))
-tags = sorted(set(tags))
-
-print(len(xy), "patterns")
-print(len(tags), "tags:", tags)
-print(len(all_words), "unique stemmed words:", all_words)
-
-# create training data
-X_train = []
-y_train = []
-for (pattern_sentence, tag) in xy:
-    # X: bag of words for each pattern_sentence
-    bag = bag_of_words(pattern_sentence, all_words)
-    X_train.append(bag)
+def build_dataset(intents):
+    """
+    vocabulary, tags and the whole corpus as one (N, V) bag of words matrix
+    and a label vector, featurized in a single batch
+    """
+    all_words = []
+    tags = []
+    xy = []
+    # loop through each sentence in our intents patterns
+    for intent in intents['intents']:
+        tag = intent['tag']
+        # add to tag list
+        tags.append(tag)
+        for pattern in intent['patterns']:
+            # tokenize each word in the sentence
+            w = tokenize(pattern)
+            # add to our words list
+            all_words.extend(w)
+            # add to xy pair
+            xy.append((w, tag))
+
+    # stem and lower each word
+    ignore_words = ['?', '.', '!']
+    all_words = [stem(w) for w in all_words if w not in ignore_words]
+    # remove duplicates and sort
+    all_words = sorted(set(all_words))
+    tags = sorted(set(tags))
+
+    # X: bag of words for every pattern_sentence as one (N, V) matrix
+    featurizer = BagOfWords(all_words)
+    X = featurizer.transform_batch([pattern_sentence for (pattern_sentence, tag) in xy])
     # y: PyTorch CrossEntropyLoss needs only class labels, not one-hot
-    label = tags.index(tag)
-    y_train.append(label)
-
-X_train = np.array(X_train)
-y_train = np.array(y_train)
-
-# Hyper-parameters 
-num_epochs = 1000
-batch_size = 8
-learning_rate = 0.001
-input_size = len(X_train[0])
-hidden_size = 8
-output_size = len(tags)
-print(input_size, output_size)
-
-class ChatDataset(Dataset):
-
-    def __init__(self):
-        self.n_samples = len(X_train)
-        self.x_data = X_train
-        self.y_data = y_train
-
-    # support indexing such that dataset[i] can be used to get i-th sample
-    def __getitem__(self, index):
-        return self.x_data[index], self.y_data[index]
-
-    # we can call len(dataset) to return the size
-    def __len__(self):
-        return self.n_samples
-
-dataset = ChatDataset()
-train_loader = DataLoader(dataset=dataset,
-                          batch_size=batch_size,
-                          shuffle=True,
-                          num_workers=0)
-
-device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-
-model = NeuralNet(input_size, hidden_size, output_size).to(device)
-
-# Loss and optimizer
-criterion = nn.CrossEntropyLoss()
-optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
-
-# Train the model
-for epoch in range(num_epochs):
-    for (words, labels) in train_loader:
-        words = words.to(device)
-        labels = labels.to(dtype=torch.long).to(device)
-        
-        # Forward pass
-        outputs = model(words)
-        # if y would be one-hot, we must apply
-        # labels = torch.max(labels, 1)[1]
-        loss = criterion(outputs, labels)
-        
-        # Backward and optimize
-        optimizer.zero_grad()
-        loss.backward()
-        optimizer.step()
-        
-    if (epoch+1) % 100 == 0:
-        print (f'Epoch [{epoch+1}/{num_epochs}], Loss: {loss.item():.4f}')
-
-
-print(f'final loss: {loss.item():.4f}')
-
-data = {
-"model_state": model.state_dict(),
-"input_size": input_size,
-"hidden_size": hidden_size,
-"output_size": output_size,
-"all_words": all_words,
-"tags": tags
-}
-
-FILE = "data.pth"
-torch.save(data, FILE)
-
-print(f'training complete. file saved to {FILE}')
-
+    tag_index = {tag: i for i, tag in enumerate(tags)}
+    y = np.array([tag_index[tag] for (pattern_sentence, tag) in xy], dtype=np.int64)
+    return all_words, tags, X, y
+
+
+def train_model(X, y, model, num_epochs=1000, batch_size=8, learning_rate=0.001,
+                val_split=0.0, patience=100, device=None, log_every=100):
+    """
+    train on pre-built tensors with index-permutation mini-batches (no DataLoader)
+    with val_split > 0, a random part of the data is held out and training stops
+    once the validation loss has not improved for `patience` epochs; the best
+    weights are restored
+    returns a dict with the final loss, epochs run and samples/sec
+    """
+    device = device or torch.device('cpu')
+    X = torch.as_tensor(X, dtype=torch.float32, device=device)
+    y = torch.as_tensor(y, dtype=torch.long, device=device)
+
+    X_val = y_val = None
+    n_val = int(len(X) * val_split)
+    if n_val:
+        perm = torch.randperm(len(X), device=device)
+        X_val, y_val = X[perm[:n_val]], y[perm[:n_val]]
+        X, y = X[perm[n_val:]], y[perm[n_val:]]
+
+    # Loss and optimizer
+    criterion = nn.CrossEntropyLoss()
+    optimizer = torch.optim.Adam(model.parameters(), lr=learning_rate)
+
+    n = len(X)
+    best_val = float('inf')
+    best_state = None
+    stale_epochs = 0
+    epoch = 0
+    start = time.perf_counter()
+    # Train the model
+    for epoch in range(num_epochs):
+        model.train()
+        perm = torch.randperm(n, device=device)
+        for i in range(0, n, batch_size):
+            idx = perm[i:i + batch_size]
+
+            # Forward pass
+            outputs = model(X[idx])
+            loss = criterion(outputs, y[idx])
+
+            # Backward and optimize
+            optimizer.zero_grad()
+            loss.backward()
+            optimizer.step()
+
+        if X_val is not None:
+            model.eval()
+            with torch.inference_mode():
+                val_loss = criterion(model(X_val), y_val).item()
+            if val_loss < best_val:
+                best_val = val_loss
+                best_state = {k: v.detach().clone() for k, v in model.state_dict().items()}
+                stale_epochs = 0
+            else:
+                stale_epochs += 1
+                if stale_epochs >= patience:
+                    print(f'early stopping at epoch {epoch+1}, best validation loss: {best_val:.4f}')
+                    break
+
+        if log_every and (epoch+1) % log_every == 0:
+            print (f'Epoch [{epoch+1}/{num_epochs}], Loss: {loss.item():.4f}')
+
+    elapsed = time.perf_counter() - start
+    if best_state is not None:
+        model.load_state_dict(best_state)
+    model.eval()
+    epochs_run = epoch + 1
+    return {
+        "loss": loss.item(),
+        "val_loss": best_val if X_val is not None else None,
+        "epochs": epochs_run,
+        "samples_per_sec": n * epochs_run / elapsed if elapsed else float('inf'),
+    }
+
+
+def grow_model(old_data, all_words, tags):
+    """
+    NeuralNet sized for the new vocabulary and tags, warm-started from old_data
+    l1 columns and l3 rows are copied for the words and tags that already existed,
+    new ones keep their fresh initialization; l2 is copied as is
+    """
+    hidden_size = old_data["hidden_size"]
+    model = NeuralNet(len(all_words), hidden_size, len(tags))
+    old_state = old_data["model_state"]
+    new_state = model.state_dict()
+
+    word_index = {w: i for i, w in enumerate(all_words)}
+    tag_index = {t: i for i, t in enumerate(tags)}
+    old_cols = [i for i, w in enumerate(old_data["all_words"]) if w in word_index]
+    new_cols = [word_index[old_data["all_words"][i]] for i in old_cols]
+    old_rows = [i for i, t in enumerate(old_data["tags"]) if t in tag_index]
+    new_rows = [tag_index[old_data["tags"][i]] for i in old_rows]
+
+    with torch.no_grad():
+        new_state["l1.weight"][:, new_cols] = old_state["l1.weight"][:, old_cols]
+        new_state["l1.bias"].copy_(old_state["l1.bias"])
+        new_state["l2.weight"].copy_(old_state["l2.weight"])
+        new_state["l2.bias"].copy_(old_state["l2.bias"])
+        new_state["l3.weight"][new_rows] = old_state["l3.weight"][old_rows]
+        new_state["l3.bias"][new_rows] = old_state["l3.bias"][old_rows]
+    model.load_state_dict(new_state)
+    return model
+
+
+def retrain(intents_path='intents.json', data_path='data.pth', num_epochs=300, **train_kwargs):
+    """
+    incremental retraining after an intents.json edit: warm-start from the
+    existing data.pth, growing the input and output layers for new words and
+    tags, train for fewer epochs and save data.pth in place
+    """
+    with open(intents_path, 'r') as f:
+        intents = json.load(f)
+    old_data = torch.load(data_path)
+
+    all_words, tags, X, y = build_dataset(intents)
+    model = grow_model(old_data, all_words, tags)
+    stats = train_model(X, y, model, num_epochs=num_epochs, log_every=0, **train_kwargs)
+
+    data = {
+    "model_state": model.state_dict(),
+    "input_size": len(all_words),
+    "hidden_size": old_data["hidden_size"],
+    "output_size": len(tags),
+    "all_words": all_words,
+    "tags": tags
+    }
+    # write next to data.pth and rename, so readers never see a partial file
+    tmp = data_path + ".tmp"
+    torch.save(data, tmp)
+    os.replace(tmp, data_path)
+    return stats
+
+
+if __name__ == "__main__":
+    with open('intents.json', 'r') as f:
+        intents = json.load(f)
+
+    all_words, tags, X_train, y_train = build_dataset(intents)
+
+    print(len(X_train), "patterns")
+    print(len(tags), "tags:", tags)
+    print(len(all_words), "unique stemmed words:", all_words)
+
+    # Hyper-parameters
+    num_epochs = 1000
+    batch_size = 8
+    learning_rate = 0.001
+    val_split = 0.0
+    input_size = len(X_train[0])
+    hidden_size = 8
+    output_size = len(tags)
+    print(input_size, output_size)
+
+    device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+    model = NeuralNet(input_size, hidden_size, output_size).to(device)
+
+    stats = train_model(X_train, y_train, model, num_epochs=num_epochs, batch_size=batch_size,
+                        learning_rate=learning_rate, val_split=val_split, device=device)
+
+    print(f'final loss: {stats["loss"]:.4f}')
+    print(f'{stats["epochs"]} epochs, {stats["samples_per_sec"]:.0f} samples/sec')
+
+    data = {
+    "model_state": model.state_dict(),
+    "input_size": input_size,
+    "hidden_size": hidden_size,
+    "output_size": output_size,
+    "all_words": all_words,
+    "tags": tags
+    }
+
+    FILE = "data.pth"
+    torch.save(data, FILE)
+
+    print(f'training complete. file saved to {FILE}')
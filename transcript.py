@@ -0,0 +1,159 @@
+import json
+import os
+import tempfile
+from collections import deque
+
+
+class Transcript:
+    """
+    model behind the chat window
+    - append() only queues a message, the UI renders everything pending
+      once per frame with take_pending()
+    - at most max_messages stay rendered, older ones are paged out to
+      JSON-Lines files of page_size messages in archive_dir
+    - archived pages stay searchable and can be restored one at a time
+    - append() returns the message id, extend() grows that message while
+      an answer streams in, even when other messages were added after it
+    """
+    def __init__(self, max_messages=300, page_size=100, archive_dir=None):
+        self.max_messages = max_messages
+        self.page_size = page_size
+        self.archive_dir = archive_dir or tempfile.mkdtemp(prefix="nsfas_transcript_")
+        self.rendered = deque()
+        self.pending = []
+        self.pending_chunks = []
+        self.archived_pages = 0
+        self.restored_pages = 0
+        self._page_buffer = []
+        # the n-th message appended has id n, rendered[0] has id first_rendered
+        self.appended = 0
+        self.first_rendered = 0
+
+    @property
+    def first_pending(self):
+        return self.appended - len(self.pending)
+
+    def append(self, sender, message):
+        """
+        queue a message, returns its id
+        """
+        self.pending.append((sender, message))
+        self.appended += 1
+        return self.appended - 1
+
+    def extend(self, message_id, text):
+        """
+        append text to the message with this id; once that message is
+        rendered the text is also queued for take_chunks()
+        """
+        i = message_id - self.first_pending
+        if i >= 0:
+            sender, message = self.pending[i]
+            self.pending[i] = (sender, message + text)
+            return
+        i = message_id - self.first_rendered
+        if i >= 0:
+            sender, message = self.rendered[i]
+            self.rendered[i] = (sender, message + text)
+            self.pending_chunks.append((message_id, text))
+            return
+        # paged out while still streaming, only a page not written yet can change
+        i = message_id - (self.first_rendered - len(self._page_buffer))
+        if i >= 0:
+            sender, message = self._page_buffer[i]
+            self._page_buffer[i] = (sender, message + text)
+
+    def take_chunks(self):
+        """
+        (message id, text) to add to the end of rendered messages, render before take_pending()
+        """
+        chunks, self.pending_chunks = self.pending_chunks, []
+        merged = []
+        for message_id, text in chunks:
+            if merged and merged[-1][0] == message_id:
+                merged[-1] = (message_id, merged[-1][1] + text)
+            else:
+                merged.append((message_id, text))
+        return merged
+
+    def take_pending(self):
+        """
+        return (new messages to render, oldest rendered messages to drop)
+        """
+        batch, self.pending = self.pending, []
+        self.rendered.extend(batch)
+        dropped = []
+        while len(self.rendered) > self.max_messages:
+            entry = self.rendered.popleft()
+            self.first_rendered += 1
+            self._archive(entry)
+            dropped.append(entry)
+        return batch, dropped
+
+    def _page_path(self, page):
+        return os.path.join(self.archive_dir, f"page_{page:06d}.jsonl")
+
+    def _archive(self, entry):
+        self._page_buffer.append(entry)
+        if len(self._page_buffer) >= self.page_size:
+            self._write_page()
+
+    def _write_page(self):
+        with open(self._page_path(self.archived_pages), "w", encoding="utf-8") as f:
+            for sender, message in self._page_buffer:
+                f.write(json.dumps([sender, message]) + "\n")
+        self.archived_pages += 1
+        self._page_buffer = []
+
+    def _read_page(self, page):
+        with open(self._page_path(page), "r", encoding="utf-8") as f:
+            return [tuple(json.loads(line)) for line in f]
+
+    def restore_previous(self):
+        """
+        messages of the next older page not on screen, oldest first,
+        or [] when everything is already shown
+        """
+        if self._page_buffer:
+            # messages dropped since the last full page come back first
+            self._write_page()
+        page = self.archived_pages - 1 - self.restored_pages
+        if page < 0:
+            return []
+        self.restored_pages += 1
+        return self._read_page(page)
+
+    def reset_restored(self):
+        self.restored_pages = 0
+
+    def iter_all(self):
+        """
+        every message of the session in order, archived ones streamed from disk
+        """
+        for page in range(self.archived_pages):
+            yield from self._read_page(page)
+        yield from self._page_buffer
+        yield from self.rendered
+        yield from self.pending
+
+    def search(self, term, limit=50):
+        term = term.lower()
+        results = []
+        for sender, message in self.iter_all():
+            if term in message.lower() or term in sender.lower():
+                results.append((sender, message))
+                if len(results) >= limit:
+                    break
+        return results
+
+    def clear(self):
+        for page in range(self.archived_pages):
+            os.remove(self._page_path(page))
+        self.rendered.clear()
+        self.pending = []
+        self.pending_chunks = []
+        self._page_buffer = []
+        self.archived_pages = 0
+        self.restored_pages = 0
+        # ids keep counting, an answer still streaming into a cleared message is dropped
+        self.first_rendered = self.appended